@@ -0,0 +1,110 @@
+import pandas as pd
+from sqlalchemy import text, INTEGER, VARCHAR, BOOLEAN
+from incremental import upsert_table
+
+#Country groups used for the MSCI classification and the preset selections in the app. This is the one place they are defined.
+
+country_groups = {
+'g7': ['Canada','France','Germany','Italy','Japan','United States','United Kingdom'],
+
+'g20': ['Canada','France','Germany','Italy','Japan','United States','United Kingdom', 'Argentina','Australia','Brazil','China','India','Indonesia',
+        'South Korea','Mexico','Russia','Saudi Arabia','South Africa','Turkey'],
+
+'nato': ['Canada','France','Germany','Italy','Belgium','United States','United Kingdom','Bulgaria','Croatia','Czech Republic','Denmark','Estonia',
+         'Finland','Greece','Hungary','Iceland','Latvia','Lithuania','Luxembourg','Netherlands','Poland','Portugal','Romania','Slovakia','Slovenia',
+         'Spain','Turkey'],
+
+'apec': ['Canada','United States','Australia','Chile','China','Hong Kong','Indonesia','Japan','South Korea','Malaysia','Mexico','New Zealand',
+         'Papua New Guinea','Peru','Philippines','Russia','Singapore','Taiwan','Thailand','Vietnam'],
+
+'msci_developed': ['Australia','Austria','Belgium','Canada','Denmark','Finland','France','Germany','Hong Kong','Ireland','Israel','Italy','Japan',
+                   'Netherlands','New Zealand','Norway','Portugal','Singapore','South Korea','Spain','Sweden','Switzerland','United Kingdom',
+                   'United States'],
+
+'msci_emerging': ['Brazil','Chile','China','Colombia','Czech Republic','Egypt','Greece','Hungary','Indonesia','India','South Korea','Mexico','Malaysia',
+                  'Peru','Philippines','Poland','Qatar','Saudi Arabia','South Africa','Thailand','Turkey','Taiwan','United Arab Emirates'],
+
+'msci_latin_america': ['Brazil', 'Mexico', 'Chile', 'Colombia', 'Peru', 'Argentina']}
+
+country_dim_schema = {
+'country_key': INTEGER,
+'country': VARCHAR(100),
+'region': VARCHAR(100),
+'msci_market': VARCHAR(100)}
+
+
+def build_country_dim(data, previous=None, counts=None):
+    """
+    Builds the country dimension table from the transformed data.
+
+    Every country gets an integer key, its region, its MSCI market classification and a boolean column for each group.
+    Keys from a previous version of the table are kept, and countries that are new get the next free keys.
+
+    Args:
+        data (pandas.DataFrame): The transformed data.
+        previous (pandas.DataFrame): The current country dimension table, if there is one.
+        counts (pandas.Series): Rows per (country, region) pair. Used instead of data when the data is not held in memory.
+
+    Returns:
+        pandas.DataFrame: The country dimension table.
+    """
+
+    if counts is None:
+        counts = data.groupby(['country', 'region'], observed=True).size()
+
+    #Use the region a country is listed under most often
+    regions = (counts.reset_index(name='n')
+                   .sort_values(['country', 'n'], ascending=[True, False])
+                   .drop_duplicates('country'))
+
+    dim = pd.DataFrame({'country': regions['country'].astype(str).values, 'region': regions['region'].astype(str).values})
+
+    keys = {} if previous is None else dict(zip(previous['country'], previous['country_key']))
+
+    next_key = max(keys.values(), default=0) + 1
+
+    for country in dim['country']:
+        if country not in keys:
+            keys[country] = next_key
+            next_key += 1
+
+    dim.insert(0, 'country_key', dim['country'].map(keys).astype(int))
+
+    #South Korea is in both MSCI lists. It is classified as developed, the same as the original MSCI query did.
+    dim['msci_market'] = 'Other'
+    dim.loc[dim['country'].isin(country_groups['msci_emerging']), 'msci_market'] = 'MSCI Emerging Market'
+    dim.loc[dim['country'].isin(country_groups['msci_developed']), 'msci_market'] = 'MSCI Developed Market'
+
+    for group, countries in country_groups.items():
+        dim[f'in_{group}'] = dim['country'].isin(countries)
+
+    return dim.sort_values('country_key').reset_index(drop=True)
+
+
+def load_country_dim(engine, data, counts=None, previous=None):
+    """
+    Updates the country_dim table in Postgres, keeping the keys it already has. New countries are added and the region,
+    market and groups of the others are updated in place, so the table is never missing while a load runs.
+
+    Returns:
+        pandas.DataFrame: The country dimension table.
+    """
+
+    with engine.begin() as conn:
+        #The star schema load passes in the keys its fact rows already use
+        if previous is None:
+            exists = conn.execute(text("SELECT to_regclass('country_dim') IS NOT NULL")).scalar()
+
+            previous = pd.read_sql("SELECT country_key, country FROM country_dim", conn) if exists else None
+
+        dim = build_country_dim(data, previous, counts)
+
+        schema = dict(country_dim_schema, **{f'in_{group}': BOOLEAN for group in country_groups})
+
+        upsert_table(conn, dim, 'country_dim', 'country_key', schema, update=True)
+
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS country_dim_country_idx ON country_dim (country)"))
+
+    print("Country dimension updated.")
+
+    return dim
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, INTEGER, SMALLINT, VARCHAR
+from countries import load_country_dim
+from incremental import upsert_table
+
+# The dimensions of the star schema. The fact table stores the key of each dimension instead of its label.
+# country_dim has more columns than the other dimensions and is built by countries.py.
+DIMENSIONS = {
+'company': {'table': 'company_dim', 'key': 'company_key', 'column': 'name', 'key_type': INTEGER},
+'country': {'table': 'country_dim', 'key': 'country_key', 'column': 'country', 'key_type': SMALLINT},
+'sector': {'table': 'sector_dim', 'key': 'sector_key', 'column': 'sector', 'key_type': SMALLINT},
+'region': {'table': 'region_dim', 'key': 'region_key', 'column': 'region', 'key_type': SMALLINT},
+'category': {'table': 'category_dim', 'key': 'category_key', 'column': 'category', 'key_type': SMALLINT}}
+
+
+class SurrogateKeys:
+    """
+    Stable integer keys for the values of one dimension.
+
+    Values keep the key they were given by earlier loads and values that are new get the next free keys, so a company
+    has the same key in every year and every load. Keys are never reused, even for values that are no longer in the data.
+    """
+
+    def __init__(self, previous=None):
+        self.keys = dict(previous or {})
+        self.next_key = max(self.keys.values(), default=0) + 1
+
+    def encode(self, values):
+        """
+        Returns the key of every value as a nullable integer array, giving new values new keys.
+        """
+
+        # Each distinct value is looked up once and the rows are mapped through their codes
+        codes, uniques = pd.factorize(values)
+
+        for value in uniques:
+            if value not in self.keys:
+                self.keys[value] = self.next_key
+                self.next_key += 1
+
+        lookup = np.array([self.keys[value] for value in uniques], dtype=np.int64)
+
+        keys = pd.array(lookup[codes] if len(lookup) else np.zeros(len(codes), dtype=np.int64), dtype='Int64')
+        keys[codes == -1] = pd.NA
+
+        return keys
+
+    def table(self, key, column):
+        return pd.DataFrame({key: list(self.keys.values()), column: list(self.keys.keys())}).sort_values(key).reset_index(drop=True)
+
+
+def load_keys(engine):
+    """
+    Reads the keys of every dimension from the dimension tables of the last load.
+
+    Returns:
+        dict: SurrogateKeys for each dimension.
+    """
+
+    keys = {}
+
+    with engine.connect() as conn:
+        for dim, spec in DIMENSIONS.items():
+            exists = conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {'t': spec['table']}).scalar()
+
+            previous = pd.read_sql(f"SELECT {spec['key']}, {spec['column']} FROM {spec['table']}", conn) if exists else None
+
+            keys[dim] = SurrogateKeys(None if previous is None else zip(previous[spec['column']], previous[spec['key']]))
+
+    return keys
+
+
+def build_fact(data, keys):
+    """
+    Replaces the labels of the transformed data with the keys of their dimensions.
+
+    Args:
+        data (pandas.DataFrame): The transformed data.
+        keys (dict): SurrogateKeys for each dimension, from load_keys. New values are given keys.
+
+    Returns:
+        pandas.DataFrame: The rows of the fact table.
+    """
+
+    fact = pd.DataFrame({spec['key']: keys[dim].encode(data[spec['column']]) for dim, spec in DIMENSIONS.items()})
+
+    for col in ['year', 'market_value', 'percent_ownership']:
+        fact[col] = data[col].to_numpy()
+
+    return fact
+
+
+def fact_schema(df_schema):
+    # The SQL types of the fact table columns, from the types of the oil_fund columns they replace
+    schema = {spec['key']: spec['key_type'] for spec in DIMENSIONS.values()}
+
+    schema.update({col: df_schema[col] for col in ['year', 'market_value', 'percent_ownership']})
+
+    return schema
+
+
+def dimension_tables(keys):
+    # Every dimension table except country_dim, which has its own attributes
+    return {spec['table']: keys[dim].table(spec['key'], spec['column']) for dim, spec in DIMENSIONS.items() if dim != 'country'}
+
+
+def load_dimensions(engine, keys, data=None, counts=None):
+    """
+    Adds the keys used by the fact table to the dimension tables in Postgres.
+
+    The tables hold every key ever given out, so rows of years that are not reloaded always find their labels. Keys are
+    never reused and keep their label, so only new keys are inserted, and the tables and the oil_fund view over them
+    stay in place while the load runs.
+
+    Returns:
+        dict: Every dimension table, by table name.
+    """
+
+    tables = dimension_tables(keys)
+
+    with engine.begin() as conn:
+        for dim, spec in DIMENSIONS.items():
+            if dim == 'country':
+                continue
+
+            upsert_table(conn, tables[spec['table']], spec['table'], spec['key'],
+                         {spec['key']: spec['key_type'], spec['column']: VARCHAR(100)})
+
+    tables['country_dim'] = load_country_dim(engine, data, counts, keys['country'].table('country_key', 'country'))
+
+    print("Dimension tables updated.")
+
+    return tables
@@ -1,50 +1,164 @@
 import os
+import io
+import sys
+import csv
 import glob
+import time
+import argparse
+import hashlib
+from datetime import datetime, timezone
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 import streamlit as st
 from sqlalchemy import create_engine, VARCHAR, BIGINT, NUMERIC, INTEGER
 from pathlib import Path
-from transform import Transformations
+from transform import Transformations, CANONICAL_NAMES_PATH
+from matching import NameMatcher, CanonicalNames
+from incremental import (FACT_TABLE, build_manifest, output_hashes, with_output_hashes, years_to_load, load_partitions, prepare_parent,
+                         stage_partition, swap_partitions)
+from staging import STAGING_DIR, write_staging, write_staging_table, begin_staging, write_staging_part, commit_staging, read_staging
+from dimensions import DIMENSIONS, load_keys, build_fact, fact_schema, load_dimensions
+from layout import apply_physical_layout
+from instrumentation import Metrics
+from rules import RuleSet
 
-def extract_data():
+#The publish stage runs the app's own queries and chart builders, which live in the repository root
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from backends import create_backend
+from payloads import publish_payloads
+
+#Explicit types for the CSV columns. Repeated labels are read as categoricals so each row only stores a small integer code.
+
+csv_dtypes = {
+'Region': 'category',
+'Country': 'category',
+'Name': 'object',
+'Industry': 'category',
+'Market Value(USD)': 'int64',
+'Ownership': 'float64'}
+
+#Columns that are dropped in the transform step are not read at all
+
+unused_columns = ['Market Value(NOK)','Voting','Incorporation Country']
+
+#The declarative cleaning rules, see rules.RuleSet
+
+cleaning_rules = RuleSet.load()
+
+
+def read_file(f, columns=None):
+    
+    #columns optionally limits the read to a few of the CSV columns
+    
+    df = pd.read_csv(f, thousands=r',', dtype=csv_dtypes, usecols=lambda c: c not in unused_columns and (columns is None or c in columns)) #Removes thousands separator when reading in CSV file. This ensures the values are integers.
     
-    os.chdir('C:/Users/rorya/Desktop/Portfolio/Projects/NorwegianOilFund/data/')
+    #Create investment category column from the first two characters of the file name. This is a constant for the whole file.
+    category = 'Equity' if f[:2] == 'EQ' else 'Fixed Income'
+    df['category'] = pd.Categorical.from_codes(np.full(len(df.index), ['Equity', 'Fixed Income'].index(category), dtype=np.int8),
+                                               categories=['Equity', 'Fixed Income'])
+    
+    #Create year column from the file name
+    df['year'] = np.full(len(df.index), int(f[3:7]), dtype=np.int16)
+    
+    return df
+
+
+def timed_read_file(f):
+    
+    #Reads a file and records how long it took, for the per-file detail of the extract metrics
+    
+    start = time.perf_counter()
+    
+    df = read_file(f)
+    
+    return df, {'file': f, 'rows': len(df.index), 'seconds': round(time.perf_counter() - start, 3)}
 
+
+def extract_data(data_dir='C:/Users/rorya/Desktop/Portfolio/Projects/NorwegianOilFund/data/', workers=8, metrics=None):
+    
+    if metrics is None:
+        metrics = Metrics()
+    
+    os.chdir(data_dir)
+    
     extension = 'csv'
 
-    all_filenames = [i for i in glob.glob('*.{}'.format(extension))]
+    #Sorted, so the rows are in the same order as in the streaming ETL and every run sees the names in the same order
+    all_filenames = sorted(glob.glob('*.{}'.format(extension)))
 
-    dfs_to_concat = []
+    with metrics.stage('extract_data') as record:
 
-    for f in all_filenames:
-        df = pd.read_csv(f, thousands=r',') #Removes thousands separator when reading in CSV file. This ensures the values are integers.
+        #Read the files in a thread pool. The C parser releases the GIL while it tokenizes, so the files are parsed in parallel.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            dfs_to_concat, files = zip(*executor.map(timed_read_file, all_filenames))
         
-        df['file_identifier'] = [f] * len(df.index) #Creates a file identifier for each csv file
+        #Give every file the same categories so the columns stay categorical when they are concatenated
+        for col in ['Region', 'Country', 'Industry']:
+            categories = union_categoricals([df[col] for df in dfs_to_concat]).categories
+            for df in dfs_to_concat:
+                df[col] = df[col].cat.set_categories(categories)
         
-        #Create investment category column by extracting the first two characters from file identifier
-        df['category'] = df['file_identifier'].apply(lambda x: 'Equity' if x[:2] == 'EQ' else 'Fixed Income')
+        # Concat dataframes together to create a combined dataframe
+        df = pd.concat(dfs_to_concat, ignore_index=True)
         
-        #Create year column from file identifier
-        df['year'] = df['file_identifier'].str[3:7].astype(int)
+        record['rows_out'] = len(df.index)
+        record['files'] = list(files)
+        record['megabytes'] = round(df.memory_usage(deep=True).sum() / 1e6, 1)
+    
+    print(f"{len(files)} files extracted in {record['seconds']:.2f}s ({record['megabytes']:.1f} MB).")
+    
+    return df
+
+
+def transform_data(data, staging_dir=STAGING_DIR, dictionary_path=CANONICAL_NAMES_PATH, metrics=None):
+
+    if metrics is None:
+        metrics = Metrics()
+    
+    with metrics.stage('transform_data', rows_in=len(data.index)) as record:
         
-        dfs_to_concat.append(df)
+        data = clean_data(data, metrics)
     
-    # Concat dataframes together to create a combined dataframe
-    df = pd.concat(dfs_to_concat)
+        trans = Transformations(dictionary_path=dictionary_path)
+        
+        print("Merging similar strings.")
+        
+        with metrics.stage('merge_similar_strings', rows_in=len(data.index)) as merge_record:
+            with metrics.rule('merge_similar_strings', data, 'name'):
+                data = trans.merge_similar_strings(data,'name')
+            merge_record.update(rows_out=len(data.index), **trans.merge_stats)
+        
+        print("Transformations complete.")
+        
+        #Keep a columnar copy of the cleaned data so later loads and analyses do not have to re-parse the CSV files
+        
+        with metrics.stage('write_staging', rows_in=len(data.index)):
+            staging_path = write_staging(data, staging_dir=staging_dir)
+        
+        record['rows_out'] = len(data.index)
     
-    print("Files extracted.")
+    print(f"Staged Parquet dataset at {staging_path}.")
     
-    return df
+    return data
 
 
-def transform_data(data):
+def clean_data(data, metrics, name_lists=None):
+    
+    #The cleaning rules of the transform step. The region, country and sector rules are declared in cleaning_rules.json
+    #and applied by the compiled rule set, which records how many rows each rule changed.
+    #The real estate and treasury rules look across every year, so their name lists are collected from the whole dataset
+    #unless name_lists passes them in, as the streaming ETL does after collecting them from every file.
 
     #Drop unwanted columns
     
     cols_to_drop = ['Market Value(NOK)','Voting','Incorporation Country','file_identifier']
 
-    data.drop(columns=cols_to_drop, inplace=True)
+    data.drop(columns=cols_to_drop, inplace=True, errors='ignore') #extract_data no longer reads these columns
     
     #Rename columns
 
@@ -58,144 +172,424 @@ def transform_data(data):
     
     data.columns = data.columns.str.lower()
     
+    #Fixed income files have no ownership column. Every file gets the columns of the oil_fund table in the same order,
+    #as the files of the whole dataset have after they are concatenated.
+    
+    data = data.reindex(columns=list(df_schema))
+    
     #Fill the percent ownership null values in fixed income with 0
     
-    data['percent_ownership'] = data['percent_ownership'].fillna(0)
+    with metrics.rule('fill_ownership', data, 'percent_ownership'):
+        data['percent_ownership'] = data['percent_ownership'].fillna(0)
     
-    #Assign countries to their appropriate regions 
+    return cleaning_rules.apply(data, metrics, name_lists)
+
+
+#SQL scripts that build the oil_fund view and the tables derived from the star schema, run in file name order after every load
+
+build_sql_dir = Path(__file__).resolve().parents[1] / 'SQL' / 'build'
+
+#Set the data types of the dataframe columns to be uploaded to postgres
 
-    data['region'] = data['region'].replace({'Australia':'Oceania',
-                                         'New Zealand':'Oceania',
-                                         'Japan':'Asia'})
+df_schema = {
+'region': VARCHAR(100),
+'country': VARCHAR(100),
+'name': VARCHAR(100),
+'sector': VARCHAR(100),
+'market_value': BIGINT,
+'percent_ownership': NUMERIC,
+'category': VARCHAR(100),
+'year': INTEGER}
+
+#The fact table stores integer keys into the dimension tables instead of the label columns, see dimensions.py
+
+fact_df_schema = fact_schema(df_schema)
+
+
+def create_db_engine():
+    
+    # Creates a connection string engine to upload a pandas dataframe to postgres database
     
-    #Fix spelling of various countries
+    secrets = st.secrets["postgres"]
+    user = secrets["user"]
+    password = secrets["password"]
+    host = secrets["host"]
+    port = secrets["port"]
+    db_name = secrets["dbname"]
+    
+    connection_str = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}"
+    
+    return create_engine(connection_str)
 
-    data['country'] = data['country'].replace({'Faeroe Islands':'Faroe Islands',
-                                           'Guernsey C. I.':'Guernsey',
-                                           'Gurensey':'Guernsey',
-                                           'Jersey C.I.':'Jersey',
-                                           'Lichtenstein':'Liechtenstein',
-                                           'Isle of Man':'Isle Of Man',
-                                           'Trinidad And Tobago':'Trinidad and Tobago',
-                                           'Tanzania *, United Republic of':'Tanzania'})
+
+def psql_insert_copy(table, conn, keys, data_iter):
+    
+    #Used as the to_sql method to stream the rows into postgres with COPY from an in-memory buffer instead of INSERTs
+    
+    dbapi_conn = conn.connection
     
-    # Fix Guernsey in sector
+    with dbapi_conn.cursor() as cur:
+        
+        #Drivers other than psycopg2 do not support COPY, so let the caller fall back to INSERTs before anything is sent
+        if not hasattr(cur, 'copy_expert'):
+            raise NotImplementedError("The database driver does not support COPY.")
+        
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(data_iter)
+        buffer.seek(0)
+        
+        columns = ', '.join('"{}"'.format(k) for k in keys)
+        table_name = '{}.{}'.format(table.schema, table.name) if table.schema else table.name
+        
+        cur.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH CSV', buffer)
+
 
-    data['sector'] = data['sector'].replace({'Guernsey':'Financials'})
+def write_table(data, table, conn, df_schema, method='copy'):
+    
+    #Appends a pandas dataframe to an existing postgres table, using COPY when the driver supports it
+    
+    start = time.perf_counter()
+    
+    if method == 'copy':
+        try:
+            data.to_sql(table, conn, if_exists='append', index=False, dtype = df_schema, method = psql_insert_copy)
+        except NotImplementedError:
+            method = 'insert'
+    
+    if method == 'insert':
+        data.to_sql(table, conn, if_exists='append', index=False, dtype = df_schema, chunksize = 1000)
+    
+    seconds = time.perf_counter() - start
+    
+    print(f"Wrote {len(data)} rows to {table} with {method.upper()} in {seconds:.2f}s ({len(data) / max(seconds, 1e-9):,.0f} rows/s).")
 
-    # Fix unknown in sector, assign the values based on company name
 
-    data['sector'] = np.where((data['sector'] == 'Unknown') & (data['name'] == 'Craft Oil Ltd'), 'Energy',
-                                np.where((data['sector'] == 'Unknown') & (data['name'] == 'Kontron S&T AG'), 'Technology',
-                                         data['sector']))
+def build_tables(engine):
     
-    #Assign consumer services to discretionary and consumer goods to consumer staples
+    #Rebuilds the rollup tables the dashboard queries read from, in one transaction so they always match oil_fund
     
-    data['sector'] = data['sector'].replace({'Consumer Services':'Consumer Discretionary',
-                                             'Consumer Goods':'Consumer Staples'})
+    with engine.begin() as conn:
+        for path in sorted(build_sql_dir.glob('*.sql')):
+            conn.exec_driver_sql(path.read_text())
+            print(f"Built {path.stem}.")
+
+
+def write_data_version(engine, manifest, staging_dir=STAGING_DIR):
     
-    #Assign oil and gas to energy
+    #Stamps the load with a new data version made of the load time and a hash of the loaded files.
+    #The app keeps its cached query results for as long as the version is the same and drops them as soon as it changes.
     
-    data['sector'] = data['sector'].replace({'Oil & Gas':'Energy'})
+    files_hash = hashlib.sha256(''.join(manifest['content_hash']).encode()).hexdigest()[:12]
     
-    #Create a list of all the unique real estate companies.
+    data_version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{files_hash}"
     
-    real_estate_companies = data['name'].loc[data['sector']== 'Real Estate'].unique().tolist()
+    version_df = pd.DataFrame({'data_version': [data_version], 'loaded_at': [pd.Timestamp.now(tz='UTC')]})
     
-    # Up until 2020 real estate companies were categorized as financials. If a company name is in the real estate list change the sector to real estate.
+    with engine.begin() as conn:
+        version_df.to_sql('load_version', conn, if_exists='replace', index=False, dtype={'data_version': VARCHAR(100)})
     
-    data['sector'] = np.where((data['name'].isin(real_estate_companies)),'Real Estate',data['sector'])
+    write_staging_table(version_df, 'load_version', staging_dir=staging_dir)
     
-    #If a company is in real estate and fixed income change the sector to corporate bonds
+    print(f"Data version {data_version}.")
     
-    data['sector'] = np.where((data['sector'] == 'Real Estate') & (data['category'] == 'Fixed Income'), 'Corporate Bonds',data['sector'])
+    return data_version
+
+
+def load_data(data, manifest, full=False, method='copy', staging_dir=STAGING_DIR, metrics=None):
     
-    #Amalgamate Securitized and Securitized Bonds
+    if metrics is None:
+        metrics = Metrics()
+       
+    engine = create_db_engine()
     
-    data['sector'] = data['sector'].replace({'Securitized':'Securitized Bonds'})
+    print("Database connection established.")
     
-    #Amalgamate corporate bonds
+    with metrics.stage('load_data', rows_in=len(data.index)) as record:
     
-    data['sector'] = data['sector'].replace({'Corporate':'Corporate Bonds',
-                                             'Corporate Bonds/Securitized Bonds':'Corporate Bonds',
-                                             'Corporate/Securitized':'Corporate Bonds',
-                                             'Convertible Bonds':'Corporate Bonds'})
+        #Only the years with new or changed files, or whose cleaned rows changed, are loaded, unless a full reload is requested.
+        #Rules that look across every year can change the cleaned rows of a year whose files did not change.
+        
+        manifest = with_output_hashes(manifest, output_hashes(data))
+        
+        years, removed_years = years_to_load(engine, manifest, full)
+        
+        record['years'] = years
+        
+        if not years and not removed_years:
+            print("No new or changed files. Nothing to load.")
+            record['rows_out'] = 0
+            return
+        
+        print(f"Loading {len(years)} of {manifest['year'].nunique()} years: {years}")
+        
+        #Replace the labels with the integer keys of the star schema. Labels seen in earlier loads keep their keys.
+        
+        keys = load_keys(engine)
+        
+        with metrics.stage('build_fact', rows_in=len(data.index)) as fact_record:
+            fact = build_fact(data, keys)
+            fact_record['rows_out'] = len(fact.index)
+        
+        #The dimension tables keep every key ever given out, so they are replaced before the new fact rows are swapped in
+        
+        with metrics.stage('load_dimensions') as dim_record:
+            dim_record['rows_out'] = load_star_dimensions(engine, keys, staging_dir, data=data)
+        
+        #Uploads the fact rows to the year partitions of the postgres database and swaps them in atomically
+        
+        with metrics.stage('load_partitions') as partitions_record:
+            load_partitions(engine, fact, manifest, years, removed_years, fact_df_schema, partial(write_table, method=method))
+            partitions_record['rows_out'] = int(fact['year'].isin(years).sum())
+        
+        write_staging(fact, name=FACT_TABLE, partition_cols=('year',), staging_dir=staging_dir)
+        
+        record['rows_out'] = partitions_record['rows_out']
+        
+        print("Data loaded into Postgres.")
+        
+        build_derived_tables(engine, manifest, staging_dir, metrics)
     
-    #Amalgamate treasuries
+    #Keep the metrics with the data they describe, so regressions can be queried across nightly runs
     
-    data['sector'] = data['sector'].replace({'Treasuries/Index Linked Bonds':'Treasuries',
-                                             'Treasuries/Index Linked Bonds/Government Related Bonds':'Treasuries',
-                                             'Treasuries/Government Related Bonds':'Treasuries'})
+    metrics.write_table(engine)
+
+
+def load_star_dimensions(engine, keys, staging_dir, data=None, counts=None):
     
-    #Create a list of all the treasuries
+    #The dimension tables are also staged so the in-process query backend can join to them
     
-    list_of_treasuries = data['name'].loc[data['sector']== 'Treasuries'].unique().tolist()
+    tables = load_dimensions(engine, keys, data, counts)
     
-    #If a bond name is in the list of treasuries then change the sector to treasuries
+    for name, table in tables.items():
+        write_staging_table(table, name, staging_dir=staging_dir)
     
-    data['sector'] = np.where((data['name'].isin(list_of_treasuries)),'Treasuries',data['sector'])
+    return sum(len(table.index) for table in tables.values())
+
+
+def build_derived_tables(engine, manifest, staging_dir, metrics):
     
-    #Amalgamate government bonds together
+    write_data_version(engine, manifest, staging_dir)
     
-    data['sector'] = data['sector'].replace({'Government':'Government Bonds',
-                                             'Government Related':'Government Bonds',
-                                             'Government Related Bonds':'Government Bonds',
-                                             'Government Related Bonds/Corporate Bonds':'Government Bonds',
-                                             'Government Related Bonds/Securitized Bonds':'Government Bonds'})
+    with metrics.stage('build_tables'):
+        build_tables(engine)
     
-    trans = Transformations()
+    with metrics.stage('apply_physical_layout'):
+        apply_physical_layout(engine)
+
+
+def publish_charts(metrics=None):
     
-    print("Merging similar strings.")
+    #Runs the queries behind the charts of Parts 1 and 2 once and publishes their results and figures for this data version,
+    #so a cold app instance reads them from disk instead of querying and building them again
     
-    data = trans.merge_similar_strings(data,'name')
+    if metrics is None:
+        metrics = Metrics()
     
-    print("Transformations complete.")
+    backend_name = os.environ.get('OIL_FUND_BACKEND', 'postgres')
+    connection_params = st.secrets["postgres"] if backend_name == 'postgres' else {}
     
-    return data
+    with metrics.stage('publish_charts'):
+        publish_payloads(create_backend(backend_name, **connection_params))
 
 
-def load_data(data):
-       
-    # Creates a connection string engine to upload a pandas dataframe to postgres database
+def read_sectors(f):
     
-    secrets = st.secrets["postgres"]
-    user = secrets["user"]
-    password = secrets["password"]
-    host = secrets["host"]
-    port = secrets["port"]
-    db_name = secrets["dbname"]
+    #Reads only the columns the real estate and treasury name lists depend on
     
-    connection_str = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}"
+    return read_file(f, columns=['Name', 'Industry']).rename(columns={'Name': 'name', 'Industry': 'sector'})
+
+
+def global_name_lists(filenames):
     
-    engine = create_engine(connection_str)
+    #The real estate and treasury rules look across every year. Two passes over the name and sector columns of each file
+    #collect the same lists clean_data collects from the whole dataset, without holding more than one file in memory.
     
-    print("Database connection established.")
+    real_estate_companies = set()
     
-    #Set the data types of the dataframe columns to be uploaded to postgres
+    for f in filenames:
+        real_estate_companies.update(cleaning_rules.collect(read_sectors(f), 'real_estate_companies'))
     
-    df_schema = {
-    'region': VARCHAR(100),
-    'country': VARCHAR(100),
-    'name': VARCHAR(100),
-    'sector': VARCHAR(100),
-    'market_value': BIGINT,
-    'percent_ownership': NUMERIC,
-    'category': VARCHAR(100),
-    'year': INTEGER}
+    name_lists = {'real_estate_companies': list(real_estate_companies)}
     
-    #Uploads the pandas dataframe to postgres database
-      
-    data.to_sql('oil_fund', engine, if_exists='replace', index=False, dtype = df_schema, chunksize = 1000)
+    list_of_treasuries = set()
+    
+    for f in filenames:
+        list_of_treasuries.update(cleaning_rules.collect(read_sectors(f), 'treasuries', name_lists))
+    
+    return dict(name_lists, treasuries=list(list_of_treasuries))
+
+
+def stream_etl(data_dir='C:/Users/rorya/Desktop/Portfolio/Projects/NorwegianOilFund/data/', full=False, method='copy',
+               staging_dir=STAGING_DIR, dictionary_path=CANONICAL_NAMES_PATH, metrics=None):
+    
+    #Runs the whole ETL one file at a time, so peak memory is bounded by the largest file instead of the whole dataset.
+    #Only the real estate and treasury name lists, the name merges, the canonical name dictionary, the dimension keys, the
+    #row counts behind the country dimension and the hashes of the cleaned files are kept between files, so the cleaned
+    #files are the same as the rows transform_data cleans from the whole dataset (see clean_files). Each cleaned file is added
+    #to the staging datasets. The years to load are then found from the hashes, and their fact rows are read back from
+    #the staged fact table a year at a time and written to the year's staging table in Postgres.
+    
+    if metrics is None:
+        metrics = Metrics()
+    
+    os.chdir(data_dir)
+    
+    filenames = sorted(glob.glob('*.csv'))
+    
+    manifest = build_manifest()
+    
+    engine = create_db_engine()
+    
+    dictionary = CanonicalNames(dictionary_path)
+    
+    keys = load_keys(engine)
+    
+    counts = []
+    
+    hashes = []
+    
+    tmp_path = begin_staging('oil_fund', staging_dir)
+    
+    fact_tmp_path = begin_staging(FACT_TABLE, staging_dir)
+    
+    with metrics.stage('stream_files') as record:
+        
+        for df in clean_files(filenames, dictionary, metrics):
+            write_staging_part(df, tmp_path)
+            counts.append(df[['country', 'region']].dropna().astype(str).value_counts())
+            hashes.append(output_hashes(df))
+            write_staging_part(build_fact(df, keys), fact_tmp_path, partition_cols=('year',))
+        
+        dictionary.save()
+        
+        staging_path = commit_staging('oil_fund', staging_dir)
+        
+        commit_staging(FACT_TABLE, staging_dir)
+        
+        record['rows_out'] = int(sum(c.sum() for c in counts))
+    
+    print(f"Staged Parquet dataset at {staging_path}.")
+    
+    #Rules that look across every year can change the cleaned rows of a year whose files did not change, so the years
+    #to load are compared by the hashes of the cleaned files as well as by the hashes of the files
+    
+    manifest = with_output_hashes(manifest, pd.concat(hashes, ignore_index=True))
+    
+    years, removed_years = years_to_load(engine, manifest, full)
+    
+    if not years and not removed_years:
+        print("No new or changed files. Nothing to load.")
+        return
+    
+    with metrics.stage('load_data') as record:
+        
+        parent, rebuild = prepare_parent(engine, fact_df_schema)
+        
+        for year in years:
+            stage_partition(engine, parent, year, [read_staged_fact(year, staging_dir)], fact_df_schema, partial(write_table, method=method))
+        
+        counts = pd.concat(counts).groupby(level=['country', 'region']).sum()
+        
+        with metrics.stage('load_dimensions') as dim_record:
+            dim_record['rows_out'] = load_star_dimensions(engine, keys, staging_dir, counts=counts)
+        
+        swap_partitions(engine, manifest, years, removed_years, rebuild)
+        
+        print(f"Loaded {len(years)} of {manifest['year'].nunique()} years: {years}")
+        
+        build_derived_tables(engine, manifest, staging_dir, metrics)
+    
+    metrics.write_table(engine)
+
+
+def read_staged_fact(year, staging_dir=STAGING_DIR):
+    
+    #The fact rows of one year from the staged fact table, with the column order and key types build_fact gives them
+    
+    fact = read_staging(filters=[('year', '=', year)], name=FACT_TABLE, staging_dir=staging_dir)
+    
+    fact = fact.astype({spec['key']: 'Int64' for spec in DIMENSIONS.values()}).astype({'year': 'int16'})
+    
+    return fact[list(fact_df_schema)]
+
+
+def clean_files(filenames, dictionary=None, metrics=None):
     
-    print("Data loaded into Postgres.")
+    #Reads and cleans the files one at a time and yields each cleaned file. The real estate and treasury name lists and
+    #the name merges look across every file, so they are computed in passes over the files first and every file is
+    #cleaned the same way transform_data cleans it as part of the whole dataset.
+    
+    if metrics is None:
+        metrics = Metrics()
+    
+    with metrics.stage('global_name_lists') as record:
+        name_lists = global_name_lists(filenames)
+        record.update({name: len(names) for name, names in name_lists.items()})
+    
+    with metrics.stage('global_name_mapping') as record:
+        mapping = global_name_mapping(filenames, name_lists, dictionary)
+        record['names'] = len(mapping)
+    
+    for f in filenames:
+        with metrics.stage(f'transform:{f}') as record:
+            df = clean_data_file(read_file(f), name_lists, mapping, metrics)
+            record['rows_out'] = len(df.index)
+        yield df
+
+
+def global_name_mapping(filenames, name_lists, dictionary=None):
+    
+    #Matches the names of every cleaned file together, in file order, so the merges and the canonical names are the ones
+    #transform_data picks for the whole dataset. Only the distinct country, sector and name rows of each file are kept.
+    
+    names = [clean_data(read_file(f), Metrics(), name_lists)[['country', 'sector', 'name']].drop_duplicates() for f in filenames]
+    
+    matcher = NameMatcher()
+    
+    mapping = matcher.match(pd.concat(names, ignore_index=True), 'name', dictionary)
+    
+    print(f"Merged {matcher.stats['merged']} of {matcher.stats['names']} names ({matcher.stats['known']} from the dictionary) "
+          f"across {matcher.stats['blocks']} blocks with {matcher.stats['comparisons']} comparisons in {matcher.stats['seconds']}s.")
+    
+    return mapping
+
+
+def clean_data_file(df, name_lists, mapping, metrics):
+    
+    #clean_data for a single file, using the name lists of the whole dataset, followed by the name merges of the whole
+    #dataset from global_name_mapping
+    
+    df = clean_data(df, metrics, name_lists)
+    
+    with metrics.rule('merge_similar_strings', df, 'name'):
+        df['name'] = df['name'].map(mapping).fillna(df['name'])
+    
+    return df
+
+
+#Manual ETL process. Pass --full to reload every year instead of only the new or changed files.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--full', action='store_true', help='Reload every year instead of only new or changed files')
+    parser.add_argument('--load-method', choices=['copy', 'insert'], default='copy', help='Write with COPY or with batched INSERTs')
+    parser.add_argument('--stream', action='store_true', help='Process one file at a time to bound memory use')
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    if args.stream:
+        stream_etl(full=args.full, method=args.load_method, metrics=metrics)
+    else:
+        raw = extract_data(metrics=metrics)
+        manifest = build_manifest()
+        transformed = transform_data(raw, metrics=metrics)
+        load_data(transformed, manifest, full=args.full, method=args.load_method, metrics=metrics)
 
+    publish_charts(metrics)
 
-#Manual ETL process
-raw = extract_data()
-transformed = transform_data(raw)
-load_data(transformed)
+    metrics.print_summary()
 
-print("ETL process complete.")
+    print(f"ETL process complete. Metrics saved to {metrics.save()}.")
 
 
 #Output dataframes as excel files to desktop for further investigating
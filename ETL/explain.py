@@ -0,0 +1,31 @@
+from etl import create_db_engine
+from layout import apply_physical_layout, drop_indexes, explain_sql_files
+from instrumentation import METRICS_DIR
+
+# Compares EXPLAIN ANALYZE timings of every SQL file without and with the indexes created by the ETL.
+# The indexes are dropped, every file is explained, the physical layout is applied again and every file is explained again.
+
+engine = create_db_engine()
+
+with engine.begin() as conn:
+    drop_indexes(conn)
+
+before = explain_sql_files(engine)
+
+apply_physical_layout(engine)
+
+after = explain_sql_files(engine)
+
+timings = before.merge(after, on='file', suffixes=('_before', '_after'))
+
+timings['speedup'] = (timings['execution_ms_before'] / timings['execution_ms_after']).round(2)
+
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+output_path = METRICS_DIR / 'explain_timings.csv'
+
+timings.to_csv(output_path, index=False)
+
+print(timings[['file', 'execution_ms_before', 'execution_ms_after', 'speedup']].to_string(index=False))
+
+print(f"Timings saved to {output_path}.")
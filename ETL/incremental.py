@@ -0,0 +1,281 @@
+import glob
+import hashlib
+from pathlib import Path
+import pandas as pd
+from sqlalchemy import text
+from layout import create_indexes, rename_indexes
+
+# Table that records every CSV file that has been loaded, along with a hash of its contents
+MANIFEST_TABLE = 'etl_manifest'
+
+# Fact table of the star schema, partitioned by year. See dimensions.py for its dimension tables.
+FACT_TABLE = 'oil_fund_fact'
+
+# Creates the oil_fund view over the star schema. Also run by build_tables after every load, see SQL/build.
+OIL_FUND_VIEW_SQL = Path(__file__).resolve().parents[1] / 'SQL' / 'build' / '00_oil_fund_view.sql'
+
+# The columns of the cleaned data that are loaded, hashed per file to find the years whose cleaned rows changed
+OUTPUT_COLUMNS = ['region', 'country', 'name', 'sector', 'market_value', 'percent_ownership', 'category', 'year']
+
+
+def build_manifest(extension='csv'):
+    """
+    Hashes every data file in the current directory.
+
+    Returns:
+        pandas.DataFrame: One row per file with its name, category, year and sha256 content hash.
+    """
+
+    rows = []
+
+    for f in sorted(glob.glob('*.{}'.format(extension))):
+        with open(f, 'rb') as file:
+            content_hash = hashlib.sha256(file.read()).hexdigest()
+
+        rows.append({'file_name': f,
+                     'category': 'Equity' if f[:2] == 'EQ' else 'Fixed Income',
+                     'year': int(f[3:7]),
+                     'content_hash': content_hash})
+
+    return pd.DataFrame(rows, columns=['file_name', 'category', 'year', 'content_hash'])
+
+
+def output_hashes(data):
+    """
+    Hashes the cleaned rows of every file, which are identified by their category and year.
+
+    Some cleaning rules look across every year, such as the real estate and treasury name lists and the name merges, so
+    a new file can change the cleaned rows of years whose own files did not change. Comparing these hashes with the
+    ones of the last load finds those years.
+
+    Returns:
+        pandas.DataFrame: One row per category and year with the sha256 hash of its cleaned rows.
+    """
+
+    # The values are hashed in fixed types, so the same rows hash the same whether a column is categorical or not
+    rows = data[OUTPUT_COLUMNS].astype({'region': str, 'country': str, 'name': str, 'sector': str, 'category': str,
+                                        'market_value': 'float64', 'percent_ownership': 'float64', 'year': 'int64'})
+
+    hashes = [{'category': category, 'year': year,
+               'output_hash': hashlib.sha256(pd.util.hash_pandas_object(group, index=False).to_numpy().tobytes()).hexdigest()}
+              for (category, year), group in rows.groupby(['category', 'year'], sort=True)]
+
+    return pd.DataFrame(hashes, columns=['category', 'year', 'output_hash'])
+
+
+def with_output_hashes(manifest, hashes):
+    # Adds the hash of each file's cleaned rows to the manifest of the data folder
+    return manifest.drop(columns='output_hash', errors='ignore').merge(hashes, on=['category', 'year'], how='left')
+
+
+def table_kind(conn, table):
+    # 'p' for a partitioned table, 'r' for a regular table and None if the table does not exist
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {'t': table}).scalar()
+
+
+def upsert_table(conn, data, table, key, dtype, update=False):
+    """
+    Adds the rows of data to a table, creating it with key as its primary key if it does not exist yet.
+
+    Rows whose key is already in the table are kept as they are, or updated with update=True. Columns the table does not
+    have yet are added. The table is never dropped or replaced, so the oil_fund view and the readers that depend on it
+    keep working while a load runs.
+
+    Args:
+        conn (sqlalchemy.engine.Connection): Connection inside the transaction of the load.
+        data (pandas.DataFrame): The rows to add.
+        table (str): The name of the table.
+        key (str): The primary key column.
+        dtype (dict): The SQL types of the columns.
+        update (bool): Overwrite the other columns of the rows whose key is already in the table.
+    """
+
+    if table_kind(conn, table) is None:
+        data.head(0).to_sql(table, conn, index=False, dtype=dtype)
+        conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({key})"))
+
+    for col in data.columns:
+        sql_type = dtype[col]() if isinstance(dtype[col], type) else dtype[col]
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col} {sql_type.compile(dialect=conn.dialect)}"))
+
+    # The rows are written next to the table and merged into it with a single statement
+    data.to_sql(f'{table}_upsert', conn, if_exists='replace', index=False, dtype=dtype)
+
+    columns = ', '.join(data.columns)
+
+    if update:
+        action = 'DO UPDATE SET ' + ', '.join(f'{col} = EXCLUDED.{col}' for col in data.columns if col != key)
+    else:
+        action = 'DO NOTHING'
+
+    conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_upsert ON CONFLICT ({key}) {action}"))
+    conn.execute(text(f"DROP TABLE {table}_upsert"))
+
+
+def years_to_load(engine, manifest, full=False):
+    """
+    Compares the manifest of the data folder with the manifest of the last load.
+
+    A year is loaded when one of its files is new or changed, or, if the manifest has the output hashes from
+    with_output_hashes, when the cleaned rows of one of its files differ from the ones that were loaded.
+
+    Returns:
+        tuple: Sorted list of years with new or changed files, and sorted list of years whose files were removed.
+    """
+
+    all_years = sorted(manifest['year'].unique().tolist())
+
+    with engine.connect() as conn:
+        # Without a partitioned table or a manifest there is nothing to compare against, so every year is loaded
+        if full or table_kind(conn, FACT_TABLE) != 'p' or table_kind(conn, MANIFEST_TABLE) is None:
+            return all_years, []
+
+        loaded = pd.read_sql(f"SELECT * FROM {MANIFEST_TABLE}", conn)
+
+    # Manifests written before the output hashes were recorded have none, so every year is compared as changed once
+    loaded = loaded.reindex(columns=['file_name', 'year', 'content_hash', 'output_hash'])
+
+    merged = manifest.merge(loaded, on=['file_name', 'year'], how='outer', suffixes=('', '_loaded'), indicator=True)
+
+    changed = (merged['_merge'] != 'both') | (merged['content_hash'] != merged['content_hash_loaded'])
+
+    if 'output_hash' in manifest:
+        changed |= merged['output_hash'] != merged['output_hash_loaded']
+
+    changed = merged[changed]
+
+    changed_years = set(changed['year'].astype(int))
+
+    removed_years = sorted(changed_years - set(all_years))
+
+    return sorted(changed_years - set(removed_years)), removed_years
+
+
+def load_partitions(engine, data, manifest, years, removed_years, df_schema, write_table):
+    """
+    Loads the given years into the fact table, which is partitioned by year, and swaps them in atomically.
+
+    Each year is first written to its own staging table while the current partitions keep serving queries. A single
+    short transaction then detaches and drops the old partitions, attaches the staged ones and updates the manifest,
+    so readers see either the old data or the new data and never an empty or half loaded table. If the table does not
+    exist yet, or is not partitioned, a partitioned table is built and swapped in.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Engine connected to the Postgres database.
+        data (pandas.DataFrame): The rows of the fact table.
+        manifest (pandas.DataFrame): The manifest of the data folder from build_manifest.
+        years (list): The years to load.
+        removed_years (list): The years whose files are gone and whose partitions should be dropped.
+        df_schema (dict): The SQL types of the fact table columns.
+        write_table (callable): Function that writes a DataFrame to a table, taking (data, table, conn, df_schema).
+    """
+
+    parent, rebuild = prepare_parent(engine, df_schema)
+
+    for year in years:
+        stage_partition(engine, parent, year, [data[data['year'] == year]], df_schema, write_table)
+
+    swap_partitions(engine, manifest, years, removed_years, rebuild)
+
+
+def prepare_parent(engine, df_schema):
+    """
+    Returns the table the staged years are attached to, and whether it is a new partitioned table that replaces the fact table.
+    """
+
+    with engine.begin() as conn:
+        rebuild = table_kind(conn, FACT_TABLE) != 'p'
+
+        parent = f'{FACT_TABLE}_new' if rebuild else FACT_TABLE
+
+        if rebuild:
+            conn.execute(text(f"DROP TABLE IF EXISTS {parent} CASCADE"))
+
+            # Create an empty partitioned parent with the same columns and types as the data
+            pd.DataFrame(columns=list(df_schema)).to_sql(parent, conn, index=False, dtype=df_schema)
+            conn.execute(text(f"ALTER TABLE {parent} RENAME TO {parent}_template"))
+            conn.execute(text(f"CREATE TABLE {parent} (LIKE {parent}_template) PARTITION BY LIST (year)"))
+            conn.execute(text(f"DROP TABLE {parent}_template"))
+
+    return parent, rebuild
+
+
+def stage_partition(engine, parent, year, chunks, df_schema, write_table):
+    """
+    Writes the rows of one year to its staging table. chunks is an iterable of DataFrames, so a year can be written one
+    file at a time without holding the whole year in memory.
+    """
+
+    staging = f'{FACT_TABLE}_{year}_staging'
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+
+        # Partitions swapped in by earlier loads kept the staging names of their indexes. They are renamed so the
+        # indexes below are built here instead of being skipped and then built by ATTACH PARTITION inside the swap.
+        rename_indexes(conn, staging, f'{FACT_TABLE}_{year}', indexes_of=FACT_TABLE)
+
+        conn.execute(text(f"CREATE TABLE {staging} (LIKE {parent})"))
+
+        for chunk in chunks:
+            write_table(chunk, staging, conn, df_schema)
+
+        # Indexes built on the staged rows now are matched to the partitioned indexes when the table is attached
+        create_indexes(conn, staging, indexes_of=FACT_TABLE)
+
+        # The check constraint lets ATTACH PARTITION skip its validation scan of the staged rows
+        conn.execute(text(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_year CHECK (year IS NOT NULL AND year = {year})"))
+
+    print(f"Staged {year}.")
+
+
+def swap_partitions(engine, manifest, years, removed_years, rebuild):
+    """
+    Swaps the staged years into the fact table and rewrites the manifest, in one transaction.
+    """
+
+    with engine.begin() as conn:
+        for year in years + removed_years:
+            partition = f'{FACT_TABLE}_{year}'
+
+            if table_kind(conn, partition) is not None:
+                if not rebuild:
+                    conn.execute(text(f"ALTER TABLE {FACT_TABLE} DETACH PARTITION {partition}"))
+                conn.execute(text(f"DROP TABLE {partition}"))
+
+        parent = f'{FACT_TABLE}_new' if rebuild else FACT_TABLE
+
+        for year in years:
+            conn.execute(text(f"ALTER TABLE {FACT_TABLE}_{year}_staging RENAME TO {FACT_TABLE}_{year}"))
+            rename_indexes(conn, f'{FACT_TABLE}_{year}_staging', f'{FACT_TABLE}_{year}', indexes_of=FACT_TABLE)
+            conn.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {FACT_TABLE}_{year} FOR VALUES IN ({year})"))
+
+        if rebuild:
+            conn.execute(text(f"DROP TABLE IF EXISTS {FACT_TABLE} CASCADE"))
+            conn.execute(text(f"ALTER TABLE {parent} RENAME TO {FACT_TABLE}"))
+
+        # oil_fund used to be the wide table of every holding. It is now a view over the star schema built by SQL/build.
+        if table_kind(conn, 'oil_fund') in ('p', 'r'):
+            conn.execute(text("DROP TABLE oil_fund CASCADE"))
+
+        # Replacing the fact table or the old wide table drops the view with it, so it is created again before readers
+        # see the swap
+        if table_kind(conn, 'oil_fund') is None:
+            conn.exec_driver_sql(OIL_FUND_VIEW_SQL.read_text())
+
+        conn.execute(text(f"""CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+                              file_name VARCHAR(100) PRIMARY KEY,
+                              category VARCHAR(100),
+                              year INTEGER,
+                              content_hash CHAR(64),
+                              output_hash CHAR(64),
+                              loaded_at TIMESTAMPTZ DEFAULT now())"""))
+
+        conn.execute(text(f"ALTER TABLE {MANIFEST_TABLE} ADD COLUMN IF NOT EXISTS output_hash CHAR(64)"))
+
+        # The manifest is rewritten in the same transaction as the partition swap, so it always matches the table
+        conn.execute(text(f"DELETE FROM {MANIFEST_TABLE}"))
+        conn.execute(text(f"INSERT INTO {MANIFEST_TABLE} (file_name, category, year, content_hash, output_hash) "
+                          "VALUES (:file_name, :category, :year, :content_hash, :output_hash)"),
+                     [dict(row, year=int(row['year']), output_hash=row['output_hash'] if isinstance(row.get('output_hash'), str) else None)
+                      for row in manifest.to_dict('records')])
@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sqlalchemy import VARCHAR
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Every ETL run writes its stage metrics here as one JSON file, so nightly runs can be compared
+METRICS_DIR = Path(__file__).resolve().parents[1] / 'metrics'
+
+METRICS_TABLE = 'etl_metrics'
+
+
+# The traced memory of every open traced_peak block, innermost last. tracemalloc keeps one peak for the whole process, so it is
+# reset whenever a stage starts or ends, after adding the peak so far to every stage that is still open.
+OPEN_STAGES = []
+
+
+# How often the resident set size is sampled while a stage runs, in seconds
+RSS_INTERVAL = 0.01
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+PROCESS = psutil.Process() if psutil is not None else None
+
+
+def rss_mb():
+    # The current resident set size of the process, from psutil or from /proc on Linux, or None if neither is available
+    if PROCESS is not None:
+        return PROCESS.memory_info().rss / 1024 ** 2
+
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def round_mb(mb):
+    return None if mb is None else round(mb, 1)
+
+
+@contextmanager
+def sampled_rss(interval=RSS_INTERVAL):
+    """
+    Samples the resident set size of the process every interval seconds on a background thread while the with block
+    runs. The yielded dict holds the size at the start and the end of the block and the largest size sampled, in MB,
+    once the block has ended. Memory that is allocated and freed again between two samples is missed.
+    """
+
+    rss = {'start': rss_mb(), 'peak': None, 'end': None}
+
+    if rss['start'] is None:
+        yield rss
+        return
+
+    rss['peak'] = rss['start']
+
+    stopped = threading.Event()
+
+    def sample():
+        while not stopped.wait(interval):
+            rss['peak'] = max(rss['peak'], rss_mb())
+
+    sampler = threading.Thread(target=sample, name='rss-sampler', daemon=True)
+    sampler.start()
+
+    try:
+        yield rss
+    finally:
+        stopped.set()
+        sampler.join()
+
+        rss['end'] = rss_mb()
+        rss['peak'] = max(rss['peak'], rss['end'])
+
+
+def fold_peak():
+    # Adds the traced peak since the last reset to every open stage and starts a new peak
+    _, peak = tracemalloc.get_traced_memory()
+
+    for memory in OPEN_STAGES:
+        memory['peak'] = max(memory['peak'], peak)
+
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def traced_peak():
+    """
+    Traces the memory Python allocates inside the with block. Blocks can be nested. The yielded dict holds the peak
+    allocated above the memory in use when the block started, in bytes, once the block has ended.
+
+    Tracing makes every allocation several times slower, so it is a diagnostic, see Metrics(trace_memory=True).
+    """
+
+    started = not tracemalloc.is_tracing()
+
+    if started:
+        tracemalloc.start()
+
+    fold_peak()
+
+    memory = {'baseline': tracemalloc.get_traced_memory()[0], 'peak': 0}
+
+    OPEN_STAGES.append(memory)
+
+    try:
+        yield memory
+    finally:
+        fold_peak()
+        OPEN_STAGES.remove(memory)
+
+        memory['peak'] = max(memory['peak'] - memory['baseline'], 0)
+
+        if started:
+            tracemalloc.stop()
+
+
+def changed_rows(before, after):
+    # Number of rows whose value differs, treating two missing values as equal
+    before = np.asarray(before, dtype=object)
+    after = np.asarray(after, dtype=object)
+
+    return int(((before != after) & ~(pd.isna(before) & pd.isna(after))).sum())
+
+
+class Metrics:
+    """
+    Records the duration, rows in and out and peak memory of every stage of an ETL run, and how many rows each
+    cleaning rule changed.
+
+    The memory of a stage is the resident set size of the process at its start and end and the largest size sampled
+    while it ran (rss_start_mb, rss_end_mb and peak_rss_mb), which covers every allocator, Arrow's included, at almost no
+    cost. With trace_memory=True every stage also records peak_mb, the most memory Python allocated during the stage as
+    traced by tracemalloc. Tracing makes the stages several times slower, so it is off by default.
+
+    Stages are timed with the stage context manager and rules with the rule context manager. The records are written
+    as one JSON file per run with save, and can be appended to the etl_metrics table with write_table.
+    """
+
+    def __init__(self, run_id=None, trace_memory=False):
+        self.run_id = run_id or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.rules = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times the stage inside the with block. The yielded dict is the stage's record, set record['rows_out'] and any
+        other detail on it inside the block.
+        """
+
+        record = {'stage': name, 'started_at': datetime.now(timezone.utc).isoformat(), 'rows_in': rows_in, 'rows_out': None}
+
+        start = time.perf_counter()
+
+        rss = {'start': None, 'peak': None, 'end': None}
+
+        memory = {'peak': None}
+
+        try:
+            with sampled_rss() as rss, traced_peak() if self.trace_memory else nullcontext(memory) as memory:
+                yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 3)
+            record['rss_start_mb'] = round_mb(rss['start'])
+            record['rss_end_mb'] = round_mb(rss['end'])
+            record['peak_rss_mb'] = round_mb(rss['peak'])
+            record['peak_mb'] = round_mb(None if memory['peak'] is None else memory['peak'] / 1024 ** 2)
+            self.stages.append(record)
+
+    @contextmanager
+    def rule(self, name, data, col):
+        """
+        Counts the rows of data[col] that the rule inside the with block changes. A rule that runs once per file, as in
+        the streaming ETL, adds to the same record each time.
+        """
+
+        before = data[col].copy()
+
+        start = time.perf_counter()
+
+        yield
+
+        seconds = time.perf_counter() - start
+
+        self.record_rule(name, col, changed_rows(before, data[col]), seconds)
+
+    def record_rule(self, name, col, rows_changed, seconds):
+        # Used directly by code that counts the changed rows itself, such as the compiled cleaning rules
+        for record in self.rules:
+            if record['rule'] == name:
+                record['rows_changed'] += rows_changed
+                record['seconds'] = round(record['seconds'] + seconds, 3)
+                return
+
+        self.rules.append({'rule': name, 'column': col, 'rows_changed': rows_changed, 'seconds': round(seconds, 3)})
+
+    def summary(self):
+        return {'run_id': self.run_id, 'stages': self.stages, 'rules': self.rules}
+
+    def save(self, metrics_dir=METRICS_DIR):
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+
+        path = metrics_dir / f'etl_{self.run_id}.json'
+        path.write_text(json.dumps(self.summary(), indent=2, default=str))
+
+        return path
+
+    def to_frame(self):
+        # One row per stage and one per rule, in the long format of the metrics table
+        rows = []
+
+        for record in self.stages:
+            for metric in ('seconds', 'rows_in', 'rows_out', 'rss_start_mb', 'rss_end_mb', 'peak_rss_mb', 'peak_mb'):
+                if record.get(metric) is not None:
+                    rows.append({'run_id': self.run_id, 'stage': record['stage'], 'metric': metric, 'value': float(record[metric])})
+
+        for record in self.rules:
+            for metric in ('rows_changed', 'seconds'):
+                rows.append({'run_id': self.run_id, 'stage': f"rule:{record['rule']}", 'metric': metric, 'value': float(record[metric])})
+
+        return pd.DataFrame(rows, columns=['run_id', 'stage', 'metric', 'value'])
+
+    def write_table(self, engine):
+        with engine.begin() as conn:
+            self.to_frame().to_sql(METRICS_TABLE, conn, if_exists='append', index=False,
+                                   dtype={'run_id': VARCHAR(100), 'stage': VARCHAR(100), 'metric': VARCHAR(100)})
+
+    def print_summary(self):
+        for record in self.stages:
+            print(f"{record['stage']}: {record['seconds']:.2f}s, rows {record['rows_in']} -> {record['rows_out']}, "
+                  f"RSS {record['rss_start_mb']} -> {record['rss_end_mb']} MB, peak RSS {record['peak_rss_mb']} MB"
+                  + (f", traced peak {record['peak_mb']} MB" if record['peak_mb'] is not None else ""))
+
+        for record in sorted(self.rules, key=lambda r: r['rows_changed'], reverse=True):
+            print(f"  rule {record['rule']}: {record['rows_changed']} rows changed in {record['seconds']:.3f}s")
@@ -0,0 +1,101 @@
+import json
+import time
+from pathlib import Path
+import pandas as pd
+from sqlalchemy import text
+
+SQL_DIR = Path(__file__).resolve().parents[1] / 'SQL'
+
+# Composite indexes matching the filters every dashboard query uses: category, then the year window, then the dimension.
+# company_year_delta only holds equities, and its rankings read a year range either for every company or for a country or sector.
+INDEXES = {'oil_fund_fact': [('category_key', 'year', 'country_key'), ('category_key', 'year', 'sector_key'), ('company_key', 'year')],
+           'oil_fund_rollup': [('category', 'year', 'country'), ('category', 'year', 'sector')],
+           'company_year_delta': [('year', 'company_key'), ('country_key', 'year'), ('sector_key', 'year')]}
+
+# Parameters used to explain the dynamic queries, the same as the app's default selection
+EXPLAIN_PARAMS = {'num_years': 10, 'countries': ['Canada', 'United States', 'Mexico']}
+
+
+def index_name(table, columns):
+    return f"{table}_{'_'.join(columns)}_idx"
+
+
+def create_indexes(conn, table, indexes_of=None):
+    """
+    Creates the composite indexes defined for a table. indexes_of names the table whose index definitions to use,
+    so a staging partition can be given the indexes of oil_fund_fact before it is attached.
+    """
+
+    for columns in INDEXES[indexes_of or table]:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name(table, columns)} ON {table} ({', '.join(columns)})"))
+
+
+def rename_indexes(conn, table, new_table, indexes_of=None):
+    # Gives the indexes of a renamed table the names create_indexes would give them, so the old names are free again
+    for columns in INDEXES[indexes_of or new_table]:
+        conn.execute(text(f"ALTER INDEX IF EXISTS {index_name(table, columns)} RENAME TO {index_name(new_table, columns)}"))
+
+
+def drop_indexes(conn):
+    for table, indexes in INDEXES.items():
+        for columns in indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name(table, columns)}"))
+
+
+def apply_physical_layout(engine):
+    """
+    Creates the indexes on oil_fund_fact, its rollup and the company deltas and refreshes the planner statistics.
+
+    oil_fund_fact is already partitioned by year by the incremental load, so queries with a year window only scan the
+    partitions in the window. An index created on the partitioned table is created on every partition, and partitions
+    attached later by the load are given the same indexes before they are attached.
+    """
+
+    with engine.begin() as conn:
+        for table in INDEXES:
+            create_indexes(conn, table)
+
+    # ANALYZE can not run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in INDEXES:
+            conn.execute(text(f"ANALYZE {table}"))
+
+    print("Physical layout applied.")
+
+
+def explain_sql_files(engine, params=EXPLAIN_PARAMS):
+    """
+    Runs EXPLAIN ANALYZE on every SQL file in SQL/static and SQL/dynamic.
+
+    Returns:
+        pandas.DataFrame: The planning and execution time in milliseconds of each file.
+    """
+
+    rows = []
+
+    with engine.connect() as conn:
+        for path in sorted(SQL_DIR.glob('static/**/*.sql')) + sorted(SQL_DIR.glob('dynamic/*.sql')):
+            query = path.read_text()
+
+            # Dynamic queries take the number of years, and the multiselect queries also take a list of countries
+            query_params = ()
+            if '{}' in query:
+                countries = params['countries']
+                query = query.format(','.join(['%s'] * len(countries)))
+                # The per country queries cover every year and only take the countries
+                query_params = (params['num_years'], *countries) if query.count('%s') > len(countries) else tuple(countries)
+            elif '%s' in query:
+                query_params = (params['num_years'],)
+
+            start = time.perf_counter()
+            plan = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", query_params).scalar()
+            wall_ms = (time.perf_counter() - start) * 1000
+
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+
+            rows.append({'file': path.relative_to(SQL_DIR).as_posix(),
+                         'planning_ms': plan[0]['Planning Time'],
+                         'execution_ms': plan[0]['Execution Time'],
+                         'wall_ms': round(wall_ms, 3)})
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,297 @@
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+from fuzzywuzzy import fuzz, utils
+
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import Indel
+except ImportError:
+    rf_process = None
+
+
+class NameMatcher:
+    """
+    Blocked fuzzy matcher that merges near-duplicate names within each (country, sector) block.
+
+    Names are only ever compared against other names in the same block. Within a block every name is reduced
+    to the key that fuzzywuzzy's token_sort_ratio scores on (processed, lowercased, tokens sorted), so names
+    that share a key score 100 and are merged by a hash lookup without any comparison. The remaining distinct
+    keys are scored against each other as one batch, using rapidfuzz's vectorized cdist when it is installed.
+
+    When a CanonicalNames dictionary is passed to match, names it already knows are resolved with a single lookup
+    and only names it has never seen are scored, against the canonical names the dictionary holds for their block.
+
+    The merges of every block are then resolved transitively (see resolve), so a name gets the same canonical name in
+    every block it appears in.
+
+    After each call to match, the stats attribute holds the wall-clock time and the number of comparisons made.
+    """
+
+    def __init__(self, threshold=100):
+        self.threshold = threshold
+        self.stats = {}
+
+    @staticmethod
+    def sort_key(name):
+        # Same string that fuzz.token_sort_ratio compares, so equal keys always score 100
+        return " ".join(sorted(utils.full_process(str(name), force_ascii=True).split()))
+
+    def match(self, df, col, dictionary=None):
+        """
+        Builds a mapping of every name in a DataFrame column to its canonical name.
+
+        Args:
+            df (pandas.DataFrame): The DataFrame containing the country, sector and name columns.
+            col (str): The name of the column to be merged.
+            dictionary (CanonicalNames): Optional persistent dictionary. New merges are added to it.
+
+        Returns:
+            dict: Mapping of each original name to the name it should be merged into.
+        """
+
+        start = time.perf_counter()
+
+        comparisons = 0
+
+        # Every merge of every block, as pairs of a name and the name it was merged into
+        merges = []
+
+        known = set()
+
+        # One row per name within each block, kept in order of first appearance so the earliest name wins ties
+        blocks = df[['country', 'sector', col]].dropna().drop_duplicates()
+
+        for (country, sector), block in blocks.groupby(['country', 'sector'], sort=False, observed=True):
+
+            names = block[col].tolist()
+
+            block_mapping = {}
+
+            if dictionary is not None:
+                # Names already in the dictionary are resolved by a single hash lookup
+                for name in names:
+                    merged_name = dictionary.get(name, country, sector)
+                    if merged_name is not None:
+                        block_mapping[name] = merged_name
+
+                known.update(block_mapping)
+
+                names = [name for name in names if name not in block_mapping]
+
+                canonical_names = dictionary.canonical_names(country, sector)
+            else:
+                canonical_names = ()
+
+            if names:
+                new_mapping, block_comparisons = self.match_block(names, canonical_names)
+
+                comparisons += block_comparisons
+
+                block_mapping.update(new_mapping)
+
+                if dictionary is not None:
+                    dictionary.add(new_mapping, country, sector)
+
+            merges.extend(block_mapping.items())
+
+        mapping = self.resolve(merges, blocks[col].drop_duplicates().tolist())
+
+        self.stats = {'names': len(mapping),
+                      'known': len(known),
+                      'blocks': blocks[['country', 'sector']].drop_duplicates().shape[0],
+                      'merged': sum(1 for name, merged_name in mapping.items() if name != merged_name),
+                      'comparisons': comparisons,
+                      'seconds': round(time.perf_counter() - start, 3)}
+
+        return mapping
+
+    @staticmethod
+    def resolve(merges, order):
+        """
+        Resolves the merges of every block transitively, so each group of names that were merged into one another,
+        in any block, ends up with a single canonical name.
+
+        A name can be merged into a second name in one block and the second name into a third in another block, and a
+        name that is canonical in one block can be merged in another. The merges are joined with a union-find and every
+        name is mapped to the earliest name of its group in order.
+
+        Args:
+            merges (list): Pairs of a name and the name it was merged into.
+            order (list): Every name, in order of first appearance.
+
+        Returns:
+            dict: Mapping of each name to the canonical name of its group.
+        """
+
+        rank = {name: i for i, name in enumerate(order)}
+
+        parent = {}
+
+        def find(name):
+            root = name
+            while parent.get(root, root) != root:
+                root = parent[root]
+            # Point every name on the path straight at the root
+            while name != root:
+                parent[name], name = root, parent[name]
+            return root
+
+        for name, merged_name in merges:
+            a, b = find(name), find(merged_name)
+            if a != b:
+                # The earliest name becomes the root. Canonical names the dictionary holds from earlier runs that are not in
+                # order come first, so a name published by an earlier run is kept.
+                if (rank.get(b, -1), b) < (rank.get(a, -1), a):
+                    a, b = b, a
+                parent[b] = a
+
+        return {name: find(name) for name in order}
+
+    def match_block(self, names, canonical_names=()):
+        """
+        Merges the names of a single block.
+
+        Args:
+            names (list): The names in the block, in order of first appearance.
+            canonical_names (iterable): Names already known to be canonical in this block. These are matched first.
+
+        Returns:
+            tuple: Mapping of each name in names to its merged name, and the number of comparisons made.
+        """
+
+        block_mapping = {}
+
+        # The first name seen for each key becomes that key's canonical name
+        key_to_name = {}
+
+        for name in canonical_names:
+            key = self.sort_key(name)
+            if key:
+                key_to_name.setdefault(key, name)
+
+        # Canonical names are never compared with each other, only new keys are scored
+        n_canonical = len(key_to_name)
+
+        for name in names:
+            key = self.sort_key(name)
+            if key:
+                key_to_name.setdefault(key, name)
+
+        comparisons = 0
+
+        keys = list(key_to_name)
+
+        if self.threshold < 100 and len(keys) > max(n_canonical, 1):
+            key_to_name, comparisons = self.merge_keys(keys, key_to_name, n_canonical)
+
+        for name in names:
+            key = self.sort_key(name)
+
+            # Names that process to an empty string can not be scored and are left as they are
+            block_mapping[name] = key_to_name[key] if key else name
+
+        return block_mapping, comparisons
+
+    def merge_keys(self, keys, key_to_name, n_canonical=0):
+        """
+        Scores the distinct keys of a block against each other and points each key at the earliest key it matches.
+        The first n_canonical keys are already canonical and are only scored against the keys after them.
+        """
+
+        n = len(keys)
+
+        first = max(n_canonical, 1)
+
+        merged = dict(key_to_name)
+
+        if rf_process is not None:
+            # Indel normalized similarity is the same measure as fuzz.ratio, computed for the whole block at once
+            scores = rf_process.cdist(keys[first:], keys, scorer=Indel.normalized_similarity) * 100
+        else:
+            scores = [[fuzz.ratio(keys[i], keys[j]) for j in range(i)] for i in range(first, n)]
+
+        for i in range(first, n):
+            earlier = list(scores[i - first][:i])
+            best_score = max(earlier)
+            if best_score >= self.threshold:
+                # The earliest of the best scoring keys wins, as it would with process.extractOne
+                merged[keys[i]] = merged[keys[earlier.index(best_score)]]
+
+        return merged, n * (n - 1) // 2 - first * (first - 1) // 2
+
+
+class CanonicalNames:
+    """
+    Persistent, versioned dictionary of name merges keyed by (raw name, country, sector).
+
+    Entries are stored in a CSV file. Every entry records the version it was added in, and the dictionary
+    version goes up by one each time new entries are saved, so an earlier state can be loaded with load(version=...).
+    """
+
+    columns = ['raw_name', 'country', 'sector', 'canonical_name', 'version', 'added']
+
+    def __init__(self, path, version=None):
+        self.path = Path(path)
+        self.entries = {}
+        self.blocks = {}
+        self.new_entries = []
+        self.version = 0
+        self.latest_version = 0
+        self.load(version)
+
+    def load(self, version=None):
+        if not self.path.exists():
+            return
+
+        saved = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+
+        saved['version'] = saved['version'].astype(int)
+
+        self.latest_version = int(saved['version'].max()) if len(saved) else 0
+
+        if version is not None:
+            saved = saved[saved['version'] <= version]
+
+        self.version = int(saved['version'].max()) if len(saved) else 0
+
+        for raw_name, country, sector, canonical_name in saved[['raw_name', 'country', 'sector', 'canonical_name']].itertuples(index=False):
+            self.entries[(raw_name, country, sector)] = canonical_name
+            self.blocks.setdefault((country, sector), {})[canonical_name] = None
+
+    def get(self, name, country, sector):
+        return self.entries.get((name, country, sector))
+
+    def canonical_names(self, country, sector):
+        # Dict keys keep the order the canonical names were first added in
+        return list(self.blocks.get((country, sector), {}))
+
+    def add(self, mapping, country, sector):
+        for name, canonical_name in mapping.items():
+            self.entries[(name, country, sector)] = canonical_name
+            self.blocks.setdefault((country, sector), {})[canonical_name] = None
+            self.new_entries.append((name, country, sector, canonical_name))
+
+    def save(self):
+        """
+        Appends the entries added since the dictionary was loaded as a new version.
+        """
+
+        if not self.new_entries:
+            return
+
+        # Always write after the newest version in the file, even if an older version was loaded
+        self.latest_version += 1
+
+        self.version = self.latest_version
+
+        added = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        new = pd.DataFrame(self.new_entries, columns=self.columns[:4])
+        new['version'] = self.version
+        new['added'] = added
+
+        new.to_csv(self.path, mode='a', header=not self.path.exists(), index=False)
+
+        self.new_entries = []
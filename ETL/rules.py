@@ -0,0 +1,260 @@
+import json
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# The cleaning rules of the transform step, applied in order by RuleSet
+RULES_PATH = Path(__file__).resolve().parent / 'cleaning_rules.json'
+
+
+class CodedColumn:
+    """
+    A column held as integer codes into a list of values while the rules run.
+
+    Map rules only ever change the lookup table that the codes are read through, which has one entry per distinct value,
+    so any number of consecutive map rules costs nothing per row. The lookup is applied to the codes, in one integer
+    take, only when a case rule or a collect step needs the current values of the rows.
+    """
+
+    def __init__(self, series, extra_values=()):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = list(series.cat.categories)
+            codes = series.cat.codes.to_numpy()
+        else:
+            codes, uniques = pd.factorize(series)
+            values = list(uniques)
+
+        self.index = {value: i for i, value in enumerate(values)}
+
+        for value in extra_values:
+            if value not in self.index:
+                self.index[value] = len(values)
+                values.append(value)
+
+        self.values = values
+        self.codes = codes.astype(np.int32)
+        self.lookup = None
+        self.counts = None
+        self.changed = False
+
+    def size(self):
+        return len(self.values)
+
+    def identity(self):
+        # One entry per value plus a last entry for missing values, so the -1 code of a missing value maps to itself
+        lookup = np.arange(self.size() + 1, dtype=np.int32)
+        lookup[-1] = -1
+        return lookup
+
+    def current(self):
+        if self.lookup is not None:
+            self.codes = self.lookup[self.codes]
+            self.lookup = None
+        return self.codes
+
+    def table(self, values):
+        # Boolean table over the codes that is True for the given values, indexed like the lookup
+        table = np.zeros(self.size() + 1, dtype=bool)
+        for value in values:
+            if value in self.index:
+                table[self.index[value]] = True
+        return table
+
+    def value_counts(self):
+        # Rows per value, kept up to date by the rules so changed rows can be counted without another pass
+        if self.counts is None:
+            codes = self.current()
+            self.counts = np.bincount(codes[codes >= 0], minlength=self.size())
+        return self.counts
+
+    def to_categorical(self):
+        return pd.Categorical.from_codes(self.current(), categories=self.values).remove_unused_categories()
+
+
+class RuleSet:
+    """
+    Declarative cleaning rules compiled into as few passes over the data as possible.
+
+    The rules are read from a JSON file and applied in order. There are three kinds:
+
+    - map rules replace values of a column: {"name": ..., "column": ..., "map": {old: new}}
+    - case rules set a column where conditions hold, the first matching case winning:
+      {"name": ..., "column": ..., "cases": [{"when": {column: [values] or {"list": list_name}}, "set": value}]}
+    - collect steps gather the distinct values of a column where conditions hold into a named list that later
+      case rules can refer to: {"collect": list_name, "column": ..., "where": {column: [values]}}
+
+    Every column a rule reads or writes is converted to integer codes once. Map rules are composed into a lookup table
+    over the distinct values and never touch the rows, and conditions are evaluated as lookups of the codes, so the
+    transform time grows with the number of case rules and not with the number of mappings or their size.
+    New rules are added to the JSON file without any code changes.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, 'r') as file:
+            return cls(json.load(file)['rules'])
+
+    def columns(self):
+        # Every column a rule reads or writes, and the values the rules can write to each of them
+        columns = {}
+
+        for rule in self.rules:
+            targets = columns.setdefault(rule['column'], set())
+
+            if 'map' in rule:
+                targets.update(rule['map'].values())
+
+            for case in rule.get('cases', []):
+                targets.add(case['set'])
+
+            for condition in [case['when'] for case in rule.get('cases', [])] + [rule.get('where', {})]:
+                for col in condition:
+                    columns.setdefault(col, set())
+
+        return columns
+
+    def apply(self, data, metrics=None, name_lists=None):
+        """
+        Applies every rule to data.
+
+        Args:
+            data (pandas.DataFrame): The data to clean. The columns the rules change become categoricals.
+            metrics (Metrics): Optional metrics to record how many rows each rule changed.
+            name_lists (dict): Lists to use instead of the collect steps of the same name, such as the lists the
+                streaming ETL collects from every file before it cleans them one at a time.
+
+        Returns:
+            pandas.DataFrame: The cleaned data.
+        """
+
+        coded = self.run(data, metrics, name_lists)
+
+        for col, column in coded.items():
+            if column.changed:
+                data[col] = column.to_categorical()
+
+        return data
+
+    def collect(self, data, list_name, name_lists=None):
+        """
+        Runs the rules up to the collect step list_name and returns the list it collects. Rules for columns that data
+        does not have are skipped, so this can run on just the columns the list depends on.
+        """
+
+        lists = {}
+
+        self.run(data, name_lists=name_lists, stop_at=list_name, collected=lists)
+
+        return lists[list_name]
+
+    def run(self, data, metrics=None, name_lists=None, stop_at=None, collected=None):
+
+        name_lists = dict(name_lists or {})
+
+        collected = {} if collected is None else collected
+
+        coded = {col: CodedColumn(data[col], targets) for col, targets in self.columns().items() if col in data}
+
+        for rule in self.rules:
+
+            if stop_at is not None and rule['column'] not in coded:
+                continue
+
+            start = time.perf_counter()
+
+            if 'collect' in rule:
+                # A list passed in by the caller takes the place of the one the step would collect
+                if rule['collect'] not in name_lists:
+                    column = coded[rule['column']]
+                    codes = column.current()[self.mask(coded, rule['where'], name_lists)]
+                    name_lists[rule['collect']] = [column.values[code] for code in np.unique(codes[codes >= 0])]
+
+                collected[rule['collect']] = name_lists[rule['collect']]
+
+                if rule['collect'] == stop_at:
+                    break
+
+                continue
+
+            column = coded[rule['column']]
+
+            if 'map' in rule:
+                rows_changed = self.apply_map(column, rule['map'], count=metrics is not None)
+            else:
+                rows_changed = self.apply_cases(coded, column, rule['cases'], name_lists, count=metrics is not None)
+
+            column.changed = True
+
+            if metrics is not None:
+                metrics.record_rule(rule['name'], rule['column'], rows_changed, time.perf_counter() - start)
+
+        return coded
+
+    @staticmethod
+    def apply_map(column, mapping, count=False):
+        lookup = column.identity()
+
+        for old, new in mapping.items():
+            if old in column.index:
+                lookup[column.index[old]] = column.index[new]
+
+        rows_changed = 0
+
+        if count:
+            counts = column.value_counts()
+            moved = lookup[:-1] != np.arange(column.size())
+            rows_changed = int(counts[moved].sum())
+            column.counts = np.bincount(lookup[:-1], weights=counts, minlength=column.size()).astype(np.int64)
+
+        # Composing the lookups is the whole cost of a map rule, the rows are not touched
+        column.lookup = lookup if column.lookup is None else lookup[column.lookup]
+
+        return rows_changed
+
+    def apply_cases(self, coded, column, cases, name_lists, count=False):
+        if count:
+            column.value_counts()
+
+        codes = column.current()
+
+        assigned = np.zeros(len(codes), dtype=bool)
+
+        rows_changed = 0
+
+        for case in cases:
+            mask = self.mask(coded, case['when'], name_lists) & ~assigned
+
+            target = column.index[case['set']]
+
+            if count:
+                previous = codes[mask]
+                rows_changed += int((previous != target).sum())
+                column.counts = column.counts - np.bincount(previous[previous >= 0], minlength=column.size())
+                column.counts[target] += int(mask.sum())
+
+            codes[mask] = target
+
+            assigned |= mask
+
+        return rows_changed
+
+    @staticmethod
+    def mask(coded, conditions, name_lists):
+        # Rows where every condition holds, each evaluated as one lookup of the column's codes
+        mask = None
+
+        for col, values in conditions.items():
+            if isinstance(values, dict):
+                values = name_lists[values['list']]
+
+            column = coded[col]
+
+            condition = column.table(values)[column.current()]
+
+            mask = condition if mask is None else mask & condition
+
+        return mask
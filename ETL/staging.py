@@ -0,0 +1,151 @@
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columnar copy of the cleaned data, shared by the ETL and anything that wants to read it without Postgres
+STAGING_DIR = Path(__file__).resolve().parents[1] / 'staging'
+
+
+def write_staging(data, name='oil_fund', partition_cols=('category', 'year'), staging_dir=STAGING_DIR):
+    """
+    Writes a DataFrame as a Parquet dataset partitioned by category and year.
+
+    String columns are dictionary encoded, so every distinct region, country, sector and name is stored once per file.
+    The dataset is written next to the current one and then made current by switching its pointer file, so readers never
+    see a partial dataset.
+
+    Args:
+        data (pandas.DataFrame): The transformed data.
+        name (str): The name of the dataset directory inside the staging directory.
+        partition_cols (tuple): The columns to partition the dataset by.
+        staging_dir (pathlib.Path): The staging directory.
+
+    Returns:
+        pathlib.Path: The path of the dataset.
+    """
+
+    tmp_path = begin_staging(name, staging_dir)
+
+    write_staging_part(data, tmp_path, partition_cols)
+
+    return commit_staging(name, staging_dir)
+
+
+def begin_staging(name='oil_fund', staging_dir=STAGING_DIR):
+    """
+    Clears the directory a new version of a dataset is written to and returns its path. Parts are added to it with
+    write_staging_part and it becomes the current version of the dataset when commit_staging is called.
+    """
+
+    tmp_path = Path(staging_dir) / f'{name}.tmp'
+
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    return tmp_path
+
+
+def write_staging_part(data, tmp_path, partition_cols=('category', 'year')):
+    # Adds the rows of data to the dataset being written. Each call writes new files, so the rows can arrive a file at a time.
+
+    data = data.copy()
+
+    # Categoricals become dictionary encoded Arrow columns
+    for col in data.columns:
+        if data[col].dtype == object:
+            data[col] = data[col].astype('category')
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+
+    pq.write_to_dataset(table, tmp_path, partition_cols=list(partition_cols), use_dictionary=True)
+
+
+def commit_staging(name='oil_fund', staging_dir=STAGING_DIR, keep=2):
+    """
+    Makes the newly written dataset the current version.
+
+    The new files are moved into their own version directory and the dataset's pointer file is then switched to it with a
+    single os.replace, so the current dataset is never missing, even if the process stops half way. The previous version
+    is kept for readers that are still scanning it, and older versions are removed.
+
+    Returns:
+        pathlib.Path: The path of the new version.
+    """
+
+    staging_dir = Path(staging_dir)
+    versions_dir = staging_dir / f'{name}.versions'
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    path = versions_dir / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}"
+    (staging_dir / f'{name}.tmp').rename(path)
+
+    pointer_tmp = staging_dir / f'{name}.current.tmp'
+    pointer_tmp.write_text(path.relative_to(staging_dir).as_posix())
+    pointer_tmp.replace(staging_dir / f'{name}.current')
+
+    # Datasets written before the versioned layout were plain directories
+    shutil.rmtree(staging_dir / name, ignore_errors=True)
+    shutil.rmtree(staging_dir / f'{name}.old', ignore_errors=True)
+
+    for old_path in sorted(versions_dir.iterdir(), reverse=True)[keep:]:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    return path
+
+
+def dataset_path(name='oil_fund', staging_dir=STAGING_DIR):
+    # The current version of a dataset, from its pointer file, or the plain directory of the layout before versioning
+    pointer = Path(staging_dir) / f'{name}.current'
+
+    if pointer.exists():
+        return Path(staging_dir) / pointer.read_text().strip()
+
+    return Path(staging_dir) / name
+
+
+def write_staging_table(data, name, staging_dir=STAGING_DIR):
+    """
+    Writes a small table, such as a dimension table, as a single Parquet file next to the staged datasets.
+
+    Returns:
+        pathlib.Path: The path of the file.
+    """
+
+    path = Path(staging_dir) / f'{name}.parquet'
+    tmp_path = Path(staging_dir) / f'{name}.parquet.tmp'
+
+    Path(staging_dir).mkdir(parents=True, exist_ok=True)
+
+    pq.write_table(pa.Table.from_pandas(data, preserve_index=False), tmp_path)
+
+    tmp_path.replace(path)
+
+    return path
+
+
+def read_staging(columns=None, filters=None, name='oil_fund', as_arrow=False, staging_dir=STAGING_DIR):
+    """
+    Reads part of a staged Parquet dataset.
+
+    Only the requested columns are read, and partitions that do not match the filters are skipped without opening them.
+    Files are memory mapped, and with as_arrow=True the Arrow table is returned without copying it into pandas.
+
+    Args:
+        columns (list): The columns to read. Reads every column when None.
+        filters (list): Filters in the pyarrow format, e.g. [('category', '=', 'Equity'), ('year', '>=', 2013)].
+        name (str): The name of the dataset directory inside the staging directory.
+        as_arrow (bool): Return a pyarrow.Table instead of a pandas DataFrame.
+        staging_dir (pathlib.Path): The staging directory.
+
+    Returns:
+        pandas.DataFrame or pyarrow.Table: The requested data.
+    """
+
+    table = pq.read_table(dataset_path(name, staging_dir), columns=columns, filters=filters, memory_map=True)
+
+    if as_arrow:
+        return table
+
+    # Dictionary encoded columns come back as categoricals
+    return table.to_pandas(self_destruct=True, split_blocks=True)
@@ -1,14 +1,23 @@
-from fuzzywuzzy import fuzz, process
-import pandas as pd
+from pathlib import Path
+from matching import NameMatcher, CanonicalNames
+
+# Canonical name dictionary that persists the name merges between ETL runs. It is written by every run, so it is kept out
+# of the source tree next to the staging and metrics directories.
+CANONICAL_NAMES_PATH = Path(__file__).resolve().parents[1] / 'canonical_names.csv'
 
 class Transformations:
     
-    def __init__(self):
-        pass
+    def __init__(self, threshold=100, dictionary_path=CANONICAL_NAMES_PATH):
+        self.threshold = threshold
+        self.dictionary_path = dictionary_path
+        self.merge_stats = {}
     
     def merge_similar_strings(self, df, col):
         """
         Merges similar strings in a DataFrame column by finding the closest match using fuzzywuzzy.
+        Names are only compared within their (country, sector) block, see matching.NameMatcher.
+        Merges are saved to the canonical name dictionary, so later runs only score names that have never been seen.
+        Pass dictionary_path=None to the constructor to match every name from scratch.
 
         Args:
             df (pandas.DataFrame): The DataFrame containing the column to be merged.
@@ -18,27 +27,23 @@ class Transformations:
             pandas.DataFrame: The modified DataFrame with merged strings.
         """
 
-        merged_dict = {}
-
-        for name in df[col].unique():
+        matcher = NameMatcher(self.threshold)
 
-            # create a copy of the rows that have the same string in the column
-            matches = df[df[col] == name].copy()
+        dictionary = CanonicalNames(self.dictionary_path) if self.dictionary_path else None
 
-            # get the unique country and industry values for the matches
-            country = matches['country'].unique()
-            sector = matches['sector'].unique()
+        # Score every (country, sector) block once and collect all of the merges into one mapping
+        merged_dict = matcher.match(df, col, dictionary)
 
-            # filter the original dataframe by country and industry and get the unique string values
-            choices = df[df['country'].isin(country) & df['sector'].isin(sector)][col].unique()
+        if dictionary is not None:
+            dictionary.save()
 
-            # find the closest match to the current string in the filtered choices using fuzzywuzzy extractOne
-            merged_name = process.extractOne(name, choices, scorer=fuzz.token_sort_ratio)[0]
+        # Apply every merge in a single pass over the column
+        df[col] = df[col].map(merged_dict).fillna(df[col])
 
-            # update the name column in the original dataframe with the merged name for the rows that had the original name
-            df.loc[df[col] == name, col] = merged_name
+        self.merge_stats = matcher.stats
 
-            # update the merged_dict with the original name and the merged name
-            merged_dict[name] = merged_name
+        print(f"Merged {matcher.stats['merged']} of {matcher.stats['names']} names ({matcher.stats['known']} from the dictionary) "
+              f"across {matcher.stats['blocks']} blocks "
+              f"with {matcher.stats['comparisons']} comparisons in {matcher.stats['seconds']}s.")
 
         return df
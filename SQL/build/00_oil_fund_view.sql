@@ -0,0 +1,8 @@
+CREATE OR REPLACE VIEW oil_fund AS
+SELECT r.region, c.country, co.name, s.sector, f.market_value, f.percent_ownership, cat.category, f.year
+FROM oil_fund_fact f
+LEFT JOIN region_dim r ON r.region_key = f.region_key
+LEFT JOIN country_dim c ON c.country_key = f.country_key
+LEFT JOIN company_dim co ON co.company_key = f.company_key
+LEFT JOIN sector_dim s ON s.sector_key = f.sector_key
+LEFT JOIN category_dim cat ON cat.category_key = f.category_key;
@@ -0,0 +1,17 @@
+DROP TABLE IF EXISTS oil_fund_rollup;
+
+CREATE TABLE oil_fund_rollup AS
+SELECT f.year, f.category_key, cat.category, f.region_key, r.region, f.country_key, c.country, f.sector_key, s.sector,
+f.holdings, f.market_value, f.ownership_sum, f.ownership_count
+FROM
+(SELECT year, category_key, region_key, country_key, sector_key,
+COUNT(*) AS holdings,
+SUM(market_value) AS market_value,
+SUM(percent_ownership) AS ownership_sum,
+COUNT(percent_ownership) AS ownership_count
+FROM oil_fund_fact
+GROUP BY year, category_key, region_key, country_key, sector_key) f
+LEFT JOIN category_dim cat ON cat.category_key = f.category_key
+LEFT JOIN region_dim r ON r.region_key = f.region_key
+LEFT JOIN country_dim c ON c.country_key = f.country_key
+LEFT JOIN sector_dim s ON s.sector_key = f.sector_key;
@@ -0,0 +1,6 @@
+DROP TABLE IF EXISTS oil_fund_metadata;
+
+CREATE TABLE oil_fund_metadata AS
+SELECT MIN(year) AS first_year, MAX(year) AS latest_year,
+(SELECT MAX(data_version) FROM load_version) AS data_version
+FROM oil_fund_rollup;
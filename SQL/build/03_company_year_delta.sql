@@ -0,0 +1,25 @@
+DROP TABLE IF EXISTS company_year_delta;
+
+CREATE TABLE company_year_delta AS
+SELECT company_key, country_key, sector_key, year, prev_year,
+avg_percent_ownership,
+avg_percent_ownership - prev_avg_percent_ownership AS ownership_change,
+market_value,
+market_value - prev_market_value AS market_value_change,
+(market_value - prev_market_value) * 100.0 / NULLIF(market_value, 0) AS market_value_pct_change,
+COALESCE(prev_year < year - 1, year > (SELECT first_year FROM oil_fund_metadata)) AS entered,
+COALESCE(next_year > year + 1, year < (SELECT latest_year FROM oil_fund_metadata)) AS exits
+FROM
+(SELECT company_key, country_key, sector_key, year, avg_percent_ownership, market_value,
+LAG(year) OVER w AS prev_year,
+LEAD(year) OVER w AS next_year,
+LAG(avg_percent_ownership) OVER w AS prev_avg_percent_ownership,
+LAG(market_value) OVER w AS prev_market_value
+FROM
+(SELECT company_key, country_key, MIN(sector_key) AS sector_key, year,
+AVG(percent_ownership) AS avg_percent_ownership,
+SUM(market_value) AS market_value
+FROM oil_fund_fact
+WHERE category_key = (SELECT category_key FROM category_dim WHERE category = 'Equity')
+GROUP BY company_key, country_key, year) yearly
+WINDOW w AS (PARTITION BY company_key, country_key ORDER BY year)) lagged;
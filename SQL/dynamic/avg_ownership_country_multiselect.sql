@@ -1,6 +1,6 @@
-SELECT year, country AS "Country", ROUND(AVG(percent_ownership), 2) AS avg_percent_ownership
-FROM oil_fund
-WHERE category = 'Equity' AND year > (SELECT MAX(year) - (%s + 1) FROM oil_fund)
+SELECT year, country AS "Country", ROUND(SUM(ownership_sum) / NULLIF(SUM(ownership_count), 0), 2) AS avg_percent_ownership
+FROM oil_fund_rollup
+WHERE category = 'Equity' AND year > (SELECT latest_year - (%s + 1) FROM oil_fund_metadata)
 AND country IN ({}) 
 GROUP BY year, country
 ORDER BY year
\ No newline at end of file
@@ -0,0 +1,7 @@
+SELECT d.year, d.prev_year, c.country AS "Country", co.name AS "Company", d.ownership_change
+FROM company_year_delta d
+JOIN country_dim c ON c.country_key = d.country_key
+JOIN company_dim co ON co.company_key = d.company_key
+WHERE d.prev_year IS NOT NULL
+AND d.country_key IN (SELECT country_key FROM country_dim WHERE country IN ({}))
+ORDER BY d.year
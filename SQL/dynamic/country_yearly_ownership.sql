@@ -0,0 +1,5 @@
+SELECT year, country AS "Country", SUM(ownership_sum) AS ownership_sum, SUM(ownership_count) AS ownership_count
+FROM oil_fund_rollup
+WHERE category = 'Equity' AND country IN ({})
+GROUP BY year, country
+ORDER BY year
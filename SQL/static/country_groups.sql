@@ -0,0 +1,3 @@
+SELECT country, in_g7, in_g20, in_nato, in_apec, in_msci_developed, in_msci_emerging, in_msci_latin_america
+FROM country_dim
+ORDER BY country;
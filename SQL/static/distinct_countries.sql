@@ -1,3 +1,3 @@
 SELECT DISTINCT(country)
-FROM oil_fund
+FROM oil_fund_rollup
 ORDER BY country;
\ No newline at end of file
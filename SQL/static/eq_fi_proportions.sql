@@ -1,5 +1,5 @@
-SELECT year as Year,
+SELECT year,
 ROUND(SUM(market_value) FILTER (WHERE category = 'Equity')/SUM(market_value) * 100.00,2) AS "Equity Proportion",
 ROUND(SUM(market_value) FILTER (WHERE category = 'Fixed Income')/SUM(market_value) *100.00,2) AS "Fixed Income Proportion"
-FROM oil_fund
+FROM oil_fund_rollup
 GROUP BY year;
\ No newline at end of file
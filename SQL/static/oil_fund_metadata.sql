@@ -0,0 +1,2 @@
+SELECT first_year, latest_year, data_version
+FROM oil_fund_metadata;
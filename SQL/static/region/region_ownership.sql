@@ -1,7 +1,7 @@
 SELECT * 
 FROM
-(SELECT year, region AS "Region", ROUND(AVG(percent_ownership), 2) AS avg_percent_ownership
-FROM oil_fund
+(SELECT year, region AS "Region", ROUND(SUM(ownership_sum) / NULLIF(SUM(ownership_count), 0), 2) AS avg_percent_ownership
+FROM oil_fund_rollup
 WHERE category = 'Equity' 
 GROUP BY year, region
 ORDER BY year) as subq
@@ -1,4 +1,4 @@
 SELECT year, region as "Region",
 ROUND(sum(market_value) / sum(sum(market_value)) OVER (PARTITION BY year) * 100,2) as proportion
-FROM oil_fund
+FROM oil_fund_rollup
 GROUP BY year, region
\ No newline at end of file
@@ -1,7 +1,7 @@
 SELECT * 
 FROM 
-(SELECT year, sector AS "Sector", ROUND(AVG(percent_ownership), 2) AS avg_percent_ownership
-FROM oil_fund
+(SELECT year, sector AS "Sector", ROUND(SUM(ownership_sum) / NULLIF(SUM(ownership_count), 0), 2) AS avg_percent_ownership
+FROM oil_fund_rollup
 WHERE category = 'Equity' 
 GROUP BY year, sector
 ORDER BY year) as subq
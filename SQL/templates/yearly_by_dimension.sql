@@ -0,0 +1,13 @@
+SELECT t.year, d.{column} AS "{label}", t.ownership_sum, t.ownership_count, t.market_value
+FROM
+(SELECT year, {key},
+{ownership_sum} AS ownership_sum,
+{ownership_count} AS ownership_count,
+SUM(market_value) AS market_value
+FROM {source}
+WHERE category_key = (SELECT category_key FROM category_dim WHERE category = 'Equity')
+AND year > (SELECT latest_year - (%s + 1) FROM oil_fund_metadata)
+{country_filter}
+GROUP BY year, {key}) t
+JOIN {dimension} d ON d.{key} = t.{key}
+ORDER BY t.year
@@ -1,10 +1,14 @@
+import os
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
-from plotly.subplots import make_subplots
-import numpy as np
-import psycopg2
+from backends import create_backend
+from query_cache import ResultCache
+from cumulative_change import yearly_query, cumulative_change
+from country_series import COUNTRY_GROUPS, COUNTRY_GROUPS_PATH, group_countries, avg_ownership_by_country, ownership_change_by_country, top_companies_by_ownership_change
+from payloads import MetadataCheck, current_version, read_payload
+from prewarm import CacheWarmer
+from charts import (eq_fi_figure, sector_proportions_figure, region_proportions_figure, sector_ownership_figure,
+                    sector_ownership_change_figure, sector_ownership_market_value_figure, region_ownership_figure,
+                    msci_ownership_figure, avg_ownership_country_figure, ownership_change_country_figure, top_companies_figure)
 
 st.set_page_config(page_title="Analyzing The Norwegian Oil Fund", layout="wide")
 
@@ -22,38 +26,90 @@ st.sidebar.info(
     """
     )
 
-# Initialize connection to Postgres DB. Uses st.cache_resource to only run once.
+# Initialize the query backend. Uses st.cache_resource to only run once. Postgres is the default, set the OIL_FUND_BACKEND
+# environment variable to duckdb to run the same SQL files in process against the Parquet snapshot written by the ETL.
 @st.cache_resource
-def init_connection():
-    return psycopg2.connect(**st.secrets["postgres"])
+def init_backend():
+    backend_name = os.environ.get('OIL_FUND_BACKEND', 'postgres')
+    connection_params = st.secrets["postgres"] if backend_name == 'postgres' else {}
+    return create_backend(backend_name, **connection_params)
 
-conn = init_connection()
-cur = conn.cursor()
+backend = init_backend()
 
 
-# Function that executes SQL queries and returns the results as a pandas dataframe. Uses st.cache_data to only rerun when the query changes or after 10 min.
-@st.cache_data(ttl=600)
-def run_query(query_path):
-    with open(query_path, 'r') as file:
-        query = file.read()
-    with conn.cursor() as cur:
-        cur.execute(query)
-        results = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        return pd.DataFrame(results, columns=columns)
-
-# Function that allows for multiselect in countries section    
-@st.cache_data(ttl=600)
-def run_query_dynamic_country(query_path, num_years, countries):
+# Query results are cached in one size bounded cache shared by every session. The cache is tied to the data version the ETL
+# writes after each load, so results are kept for as long as the data is unchanged and dropped as soon as a new load is seen.
+@st.cache_resource
+def init_result_cache():
+    return ResultCache()
+
+result_cache = init_result_cache()
+
+# The data version and latest year of the database are read on a background thread (see MetadataCheck), so the app starts
+# from the published payload without waiting for the database. Part 3 is the first part that queries, and it waits for them.
+@st.cache_resource
+def init_metadata_check():
+    return MetadataCheck(backend)
+
+metadata_check = init_metadata_check()
+
+# Every query goes through here first, so the query cache is moved to the data version of the database before it is used
+def database_metadata():
+    metadata = metadata_check.wait()
+    result_cache.set_version(metadata['data_version'])
+    return metadata
+
+# The ETL publishes the charts of Parts 1 and 2 after every load (see payloads.py), and current.json names the newest one.
+# Until the database has been read, the manifest of that payload gives the data version and years. Once it has been read,
+# the payload is only used when it was published for the data in the database, so a load whose publish step failed or
+# was skipped falls back to building the charts.
+@st.cache_resource(max_entries=2)
+def load_payload(data_version):
+    return read_payload(data_version)
+
+payload_version = current_version()
+
+if metadata_check.latest() is not None or payload_version is None:
+    metadata = database_metadata()
+else:
+    metadata = load_payload(payload_version)['manifest']
+
+payload = load_payload(metadata['data_version']) if payload_version == metadata['data_version'] else None
+
+latest_year = int(metadata['latest_year'])
+
+data_version = metadata['data_version']
+
+def read_sql_file(query_path):
     with open(query_path, 'r') as file:
-        query = file.read()
-    placeholders = ','.join(['%s'] * len(countries))
-    formatted_query = query.format(placeholders)
-    with conn.cursor() as cur:
-        cur.execute(formatted_query, (num_years, *countries))
-        results = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        return pd.DataFrame(results, columns=columns)
+        return file.read()
+
+# Function that executes SQL queries and returns the results as a pandas dataframe.
+def run_query(query_path):
+    return result_cache.get_or_run((query_path,), lambda: backend.query(read_sql_file(query_path)))
+
+# Function that runs a batch of SQL files at the same time on pooled connections and returns a dictionary of dataframes keyed by file path.
+# Only the files that are not already cached are sent to the database.
+def run_queries(query_paths):
+    results = {query_path: result_cache.get((query_path,)) for query_path in query_paths}
+    missing = {query_path: (read_sql_file(query_path), None) for query_path, df in results.items() if df is None}
+    for query_path, df in backend.query_many(missing).items():
+        result_cache.put((query_path,), df)
+        results[query_path] = df
+    return results
+
+# Function that serves the cumulative change charts. The yearly aggregates of a dimension are fetched with a single scan and cached,
+# and every metric and top N of that dimension and window is computed from them.
+def run_cumulative_change(dimension, num_years, metric='ownership', top_n=None):
+    query, params = yearly_query(dimension, num_years)
+    yearly = result_cache.get_or_run((query, params), lambda: backend.query(query, params))
+    return cumulative_change(yearly, dimension, latest_year, metric, top_n)
+
+# Fill the query cache for the Part 3 presets in the background. Runs once the data version of the database is known and
+# again whenever a new load is seen, with at most two warming queries in flight.
+@st.cache_resource(max_entries=1)
+def start_cache_warmer(data_version):
+    return CacheWarmer(backend, result_cache, max_workers=2).start()
 
 st.title("Analyzing The Norwegian Oil Fund")
 
@@ -87,137 +143,67 @@ st.write("""The most logical place to start the analysis is comparing the funds
          Since the covid pandemic the equity proportion has gradually subsided. While this could be attributed to equity markets coming under recent pressure, I will note that bond
          yields have also risen recently and have become more attractive on a risk adjusted basis for pension funds.""")
 
-##EQUITY TO FIXED INCOME PROPORTION
+#Run every static query together, so a cold page load only waits for the slowest query instead of all of them one after another
 
-equity_fi_df = run_query('SQL/static/eq_fi_proportions.sql')
+static_query_paths = ('SQL/static/eq_fi_proportions.sql',
+                      'SQL/static/sector/sector_proportions.sql',
+                      'SQL/static/region/region_proportions.sql',
+                      'SQL/static/sector/sector_ownership.sql',
+                      'SQL/static/region/region_ownership.sql',
+                      'SQL/static/distinct_countries.sql',
+                      'SQL/static/country_groups.sql')
 
-# Plot the data using plotly
-eq_fi_fig = px.line(equity_fi_df, x='year', y=['Equity Proportion', 'Fixed Income Proportion'], markers=True)
-eq_fi_fig.update_traces(mode="markers+lines", hovertemplate=None)
+#The figures of Parts 1 and 2 only depend on the loaded data. They are built once per data version and shared by every session,
+#so a widget interaction reruns the script without querying or rebuilding any of them.
 
-# Update the plotly figure object layout
-eq_fi_fig.update_layout(title='Equity and Fixed Income Proportions Over Time', title_x = 0.4, xaxis_title='Year', yaxis_title='Proportion Of Fund (%)',
-                        hovermode="x unified", legend_title = "")
-    
-# Plot in streamlit
-st.plotly_chart(eq_fi_fig, use_container_width=True)
+@st.cache_resource(max_entries=2)
+def static_figures(data_version):
+    static_dfs = run_queries(static_query_paths)
+    return {'eq_fi': eq_fi_figure(static_dfs['SQL/static/eq_fi_proportions.sql']),
+            'sector_proportions': sector_proportions_figure(static_dfs['SQL/static/sector/sector_proportions.sql']),
+            'region_proportions': region_proportions_figure(static_dfs['SQL/static/region/region_proportions.sql']),
+            'sector_ownership': sector_ownership_figure(static_dfs['SQL/static/sector/sector_ownership.sql']),
+            'sector_ownership_change': sector_ownership_change_figure(run_cumulative_change('sector', 10)),
+            'sector_ownership_market_value': sector_ownership_market_value_figure(run_cumulative_change('sector', 10, metric='both')),
+            'region_ownership': region_ownership_figure(static_dfs['SQL/static/region/region_ownership.sql'])}
+
+#The MSCI figure is only built the first time someone opens it
+
+@st.cache_resource(max_entries=2)
+def msci_figure(data_version):
+    return msci_ownership_figure(run_query('SQL/static/region/MSCI_ownership.sql'))
+
+figures = payload['figures'] if payload is not None else static_figures(data_version)
+
+##EQUITY TO FIXED INCOME PROPORTION
+
+st.plotly_chart(figures['eq_fi'], use_container_width=True)
 
 ##SECTOR PROPORTIONS
 
 st.write("When comparing the various sectors and type of fixed income over time...")
 
-sector_prop_df = run_query('SQL/static/sector/sector_proportions.sql')
-
-# Create a dictionary of colors for each sector
-equity_colors = {'Basic Materials': '#FFA07A',
-                 'Consumer Discretionary': '#20B2AA',
-                 'Consumer Staples': '#87CEFA',
-                 'Energy': '#B0E0E6',
-                 'Financials': '#7B68EE',
-                 'Health Care': '#FF7F50',
-                 'Industrials': '#6495ED',
-                 'Real Estate': '#9ACD32',
-                 'Technology': '#F08080',
-                 'Telecommunications': '#DDA0DD',
-                 'Utilities': '#00FFFF'}
-
-fixed_income_colors = {'Corporate Bonds': '#FFD700',
-                       'Government Bonds': '#CD5C5C',
-                       'Securitized Bonds': '#ADFF2F',
-                       'Treasuries': '#2F4F4F'}
-
-# Initialize figure with subplots
-sector_prop_fig = make_subplots(rows=2, cols=1, subplot_titles=("Equity Investments", "Fixed Income Investments"))
-
-# Create line plots for each sector within each category
-for i, category in enumerate(sector_prop_df['category'].unique()):
-    sector_df = sector_prop_df[sector_prop_df['category'] == category]
-    for j, sector in enumerate(sector_df['Sector'].unique()):
-        sector_data = sector_df[sector_df['Sector'] == sector]
-        if category == 'Equity':
-            sector_prop_fig.add_trace(go.Scatter(x=sector_data['year'], y=sector_data['Proportion of Fund'], 
-                                     mode='lines+markers', name=sector, 
-                                     line=dict(color=equity_colors[sector]), showlegend=i==0), row=i+1, col=1)
-        else:
-            sector_prop_fig.add_trace(go.Scatter(x=sector_data['year'], y=sector_data['Proportion of Fund'], 
-                                     mode='lines+markers', name=sector, 
-                                     line=dict(color=fixed_income_colors[sector]), showlegend=True), row=i+1, col=1)
-
-# Update xaxis and yaxis properties
-sector_prop_fig.update_xaxes(title_text='Year', row=2, col=1)
-sector_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)', row=1, col=1)
-sector_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)', row=2, col=1)
-
-# Update subplot titles
-sector_prop_fig.update_layout(title='Sector and Fixed Income Proportions Over Time', height=800, margin=dict(t=120), title_x = 0.35)
-
-# Set subplot titles
-sector_prop_fig.update_annotations(
-    {'text': 'Equity Investments', 'font': {'size': 24}, 'x': 0.5, 'y': 1.05, 'showarrow': False},
-    {'text': 'Fixed Income Investments', 'font': {'size': 24}, 'x': 0.5, 'y': 1.05, 'showarrow': False}
-)
-
-# Show legend for each subplot
-sector_prop_fig.update_layout(showlegend=True)
-
-# Display plot in Streamlit
-st.plotly_chart(sector_prop_fig, use_container_width=True)
+st.plotly_chart(figures['sector_proportions'], use_container_width=True)
 
 st.write("Insert blurb about sector proportions over time.")
 
 ##REGION PROPORTIONS
 
-region_prop_df = run_query('SQL/static/region/region_proportions.sql')
-
-region_prop_fig = px.line(region_prop_df, x="year", y="proportion", color="Region", title="Proportion of Fund By Region Over Time", markers=True)
-
-region_prop_fig.update_layout(title_x=0.3)
-region_prop_fig.update_xaxes(title_text='Year')
-region_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)')
-
-st.plotly_chart(region_prop_fig, use_container_width=True)
+st.plotly_chart(figures['region_proportions'], use_container_width=True)
 
 st.subheader("Part 2: Equity Inflows Over Time")
 
 ## AVG OWNERSHIP BY SECTOR OVER TIME
 
-sector_ownership_df = run_query('SQL/static/sector/sector_ownership.sql')
-
-sector_ownership_fig = px.line(sector_ownership_df, x="year", y="avg_percent_ownership", color="Sector", title="Average Ownership By Sector Over Time", markers=True)
-
-sector_ownership_fig.update_layout(title_x=0.3)
-sector_ownership_fig.update_xaxes(title_text='Year')
-sector_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
-
-st.plotly_chart(sector_ownership_fig, use_container_width=True)
+st.plotly_chart(figures['sector_ownership'], use_container_width=True)
 
 ## Cumulative Change In Percent Ownership By Sector - Last 10 Years
 
-cum_owner_change_sector_10_df = run_query('SQL/static/sector/ownership_change_sector_ten_years.sql')
-
-cum_owner_change_sector_10_fig = px.bar(cum_owner_change_sector_10_df, x = 'Sector', y='cumulative_bp_change_of_ownership', title= "Cumulative Change In Average Ownership By Sector - Last 10 Years",
-                                              text_auto= True)
-
-cum_owner_change_sector_10_fig.update_layout(title_x=0.3)
-cum_owner_change_sector_10_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
-
-st.plotly_chart(cum_owner_change_sector_10_fig, use_container_width=True)
+st.plotly_chart(figures['sector_ownership_change'], use_container_width=True)
 
 ## Cumulative Change In Percent Ownership and Market Value By Sector - Last 10 Years
 
-mrkt_value_ownership_change_sector_ten_years_df = run_query('SQL/static/sector/mrkt_value_ownership_change_sector_ten_years.sql')
-
-mrkt_value_ownership_change_sector_ten_years_fig = px.scatter(mrkt_value_ownership_change_sector_ten_years_df, 
-                                                              x= 'Cumulative Average Ownership Change', y= 'Cumulative Market Value Percent Change',
-                                                              color='Sector',
-                                                              title="Cumulative Change In Ownership and Market Value By Sector - Last 10 Years")
-
-mrkt_value_ownership_change_sector_ten_years_fig.update_traces(marker_size=10)
-mrkt_value_ownership_change_sector_ten_years_fig.update_layout(title_x=0.3, showlegend=False)
-mrkt_value_ownership_change_sector_ten_years_fig.update_xaxes(title_text='Cumulative Change In Average Ownership (Basis Points)')
-mrkt_value_ownership_change_sector_ten_years_fig.update_yaxes(title_text='Cumulative Change In Market Value (%)')
-
-st.plotly_chart(mrkt_value_ownership_change_sector_ten_years_fig, use_container_width=True)
+st.plotly_chart(figures['sector_ownership_market_value'], use_container_width=True)
 
 ## AVG OWNERSHIP BY REGION OVER TIME
 
@@ -225,130 +211,99 @@ st.write("""While North America is the largest regional proportion of the fund,
          North American markets relative to other regions.
          """)
 
-region_ownership_df = run_query('SQL/static/region/region_ownership.sql')
-
-region_ownership_fig = px.line(region_ownership_df, x="year", y="avg_percent_ownership", color="Region", title="Average Ownership By Region Over Time", markers=True)
-
-region_ownership_fig.update_layout(title_x=0.3)
-region_ownership_fig.update_xaxes(title_text='Year')
-region_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
-
-st.plotly_chart(region_ownership_fig, use_container_width=True)
+st.plotly_chart(figures['region_ownership'], use_container_width=True)
 
 ## AVG OWNERSHIP BY MSCI MARKET TYPE OVER TIME
 
-MSCI_ownership_df = run_query('SQL/static/region/MSCI_ownership.sql')
-
-MSCI_ownership_fig = px.line(MSCI_ownership_df, x="year", y="avg_percent_ownership", color="msci_market", title="Average Ownership By MSCI Market Type Over Time", markers=True)
+#A toggle in its own fragment instead of an expander, whose contents are always built. Flipping it only reruns the fragment.
 
-MSCI_ownership_fig.update_layout(title_x=0.3, hovermode="x unified", legend_title = "")
-MSCI_ownership_fig.update_xaxes(title_text='Year')
-MSCI_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
-MSCI_ownership_fig.update_traces(mode="markers+lines", hovertemplate=None)
+@st.fragment
+def msci_section():
+    if st.toggle("Show Data Based On MSCI Market Classification"):
+        st.plotly_chart(payload['figures']['msci_ownership'] if payload is not None else msci_figure(data_version), use_container_width=True)
 
-with st.expander("Click Here To See Data Based On MSCI Market Classification"):
-    st.plotly_chart(MSCI_ownership_fig, use_container_width=True)
+msci_section()
 
 
 st.subheader("Part 3: Exploring Individual Countries")
 
-#List of countries in the database that is passed to multiselect 
-countries_df = run_query('SQL/static/distinct_countries.sql')
+#Part 3 is the only section that depends on the widgets below. As a fragment, changing them reruns just this section.
 
-row1_col1, row1_col2 = st.columns([1,1])
+@st.fragment
+def country_section():
 
-with row1_col1:
-    country_selection = st.multiselect('Select Countries Of Interest: ',countries_df, default=['Canada', 'United States','Mexico'])
-    
-with row1_col2:
-    year_selection = st.number_input('Select Number of Years', min_value= 0, max_value= 20, value= 1)
-    
-#Preset list of countries based on international forums.
+    #Part 3 queries the database, so it waits for its data version and latest year instead of using the payload's
 
-g7_countries = ['Canada','France','Germany','Italy','Japan','United States','United Kingdom']
+    metadata = database_metadata()
 
-g20_countries = ['Canada','France','Germany','Italy','Japan','United States','United Kingdom', 'Argentina','Australia','Brazil','China','India','Indonesia','South Korea',
-                 'Mexico','Russia','Saudi Arabia','South Africa','Turkey']
+    latest_year = int(metadata['latest_year'])
 
-nato_countries = ['Canada','France','Germany','Italy','Belgium','United States','United Kingdom','Bulgaria','Croatia','Czech Republic','Denmark','Estonia','Finland',
-                  'Greece','Hungary','Iceland','Latvia','Lithuania','Luxembourg','Netherlands','Poland','Portugal','Romania','Slovakia','Slovenia','Spain','Turkey']
+    start_cache_warmer(metadata['data_version'])
 
-apec_countries = ['Canada','United States','Australia','Chile','China','Hong Kong','Indonesia','Japan','South Korea','Malaysia','Mexico','New Zealand','Papua New Guinea',
-                  'Peru','Philippines','Russia','Sinqapore','Taiwan','Thailand','Vietnam']
+    #List of countries in the database that is passed to multiselect 
+    countries_df = run_query('SQL/static/distinct_countries.sql')
 
-msci_developed_markets = countries = ['Australia','Austria','Belgium','Canada','Denmark','Finland','France','Germany','Hong Kong','Ireland','Israel','Italy','Japan',
-                                      'Netherlands','New Zealand','Norway','Portugal','Singapore','South Korea','Spain','Sweden','Switzerland','United Kingdom',
-                                      'United States']
+    row1_col1, row1_col2 = st.columns([1,1])
 
+    with row1_col1:
+        country_selection = st.multiselect('Select Countries Of Interest: ',countries_df, default=['Canada', 'United States','Mexico'])
+    
+    with row1_col2:
+        year_selection = st.number_input('Select Number of Years', min_value= 0, max_value= 20, value= 1)
+    
+    #Preset lists of countries based on international forums and MSCI classifications. Group membership comes from the country dimension table built by the ETL.
 
-msci_emerging_markets = ['Brazil','Chile','China','Colombia','Czech Republic','Egypt','Greece','Hungary','Indonesia','India','South Korea','Mexico','Malaysia',
-                        'Peru','Philippines','Poland','Qatar','Saudi Arabia','South Africa','Thailand','Turkey','Taiwan','United Arab Emirates']
+    country_groups_df = run_query(COUNTRY_GROUPS_PATH)
 
-msci_latin_america = ['Brazil', 'Mexico', 'Chile', 'Colombia', 'Peru', 'Argentina']
+    country_custom_selection = st.selectbox('Custom Selection',['None'] + list(COUNTRY_GROUPS))
 
-country_custom_selection = st.selectbox('Custom Selection',['None','G7 Countries', 'G20 Countries', 'NATO Countries', 'APEC Countries','MSCI Developed Countries',
-                                                            'MSCI Emerging Markets','MSCI Latin America Countries'])
+    #Change country selection based on user input. If a user has already made a selection the custom selection list will get added to the selection.
 
-#Change country selection based on user input. If a user has already made a selection the custom selection list will get added to the selection.
+    if country_custom_selection != 'None':
+        country_selection = country_selection + group_countries(country_groups_df, country_custom_selection)
 
-if country_custom_selection == 'None':
-    country_selection = country_selection
+    #Remove the duplicates that adding a preset to a selection can create, keeping the order of the selection
 
-elif country_custom_selection == 'G7 Countries':
-    country_selection = country_selection + g7_countries
+    country_selection = list(dict.fromkeys(country_selection))
 
-elif country_custom_selection == 'G20 Countries':
-    country_selection = country_selection + g20_countries
+    #The charts below are assembled in memory from yearly series that are fetched and cached per country, so changing the selection
+    #or the number of years only queries the countries that have not been fetched yet.
     
-elif country_custom_selection == 'NATO Countries':
-    country_selection = country_selection + nato_countries
+    ## AVG OWNERSHIP MULTISELECT
 
-elif country_custom_selection == 'APEC Countries':
-    country_selection = country_selection + apec_countries
+    avg_ownership_country_dynamic_df = avg_ownership_by_country(backend, result_cache, year_selection, country_selection, latest_year)
 
-elif country_custom_selection == 'MSCI Developed Countries':
-    country_selection = country_selection + msci_developed_markets
-    
-elif country_custom_selection == 'MSCI Emerging Markets':
-    country_selection = country_selection + msci_emerging_markets
-    
-elif country_custom_selection == 'MSCI Latin America Countries':
-    country_selection = country_selection + msci_latin_america
-    
-## AVG OWNERSHIP MULTISELECT
+    avg_ownership_country_dynamic_fig = avg_ownership_country_figure(avg_ownership_country_dynamic_df, year_selection)
 
-avg_ownership_country_dynamic_df = run_query_dynamic_country('SQL/dynamic/avg_ownership_country_multiselect.sql',year_selection,country_selection)
+    st.plotly_chart(avg_ownership_country_dynamic_fig, use_container_width=True)
 
-avg_ownership_country_dynamic_fig = px.line(avg_ownership_country_dynamic_df, x="year", y="avg_percent_ownership", color="Country", title=f"Average Ownership By Country Over {year_selection} Years", markers=True)
-
-avg_ownership_country_dynamic_fig.update_layout(title_x = 0.3, xaxis = dict(tickmode='array',tickvals = avg_ownership_country_dynamic_df['year'])) #Prevents plotly from adjusting the xaxis values.
-avg_ownership_country_dynamic_fig.update_xaxes(title_text='Year')
-avg_ownership_country_dynamic_fig.update_yaxes(title_text='Average Ownership (%)')
+    ## AVG OWNERSHIP CHANGE MULTISELECT
+        
+    ownership_change_country_dynamic_df = ownership_change_by_country(backend, result_cache, year_selection, country_selection, latest_year)
 
-st.plotly_chart(avg_ownership_country_dynamic_fig, use_container_width=True)
+    fig_ownership_change_country_fig = ownership_change_country_figure(ownership_change_country_dynamic_df, year_selection)
 
-## AVG OWNERSHIP CHANGE MULTISELECT
-        
-ownership_change_country_dynamic_df = run_query_dynamic_country('SQL/dynamic/ownership_change_country_multiselect.sql',year_selection,country_selection)
+    st.plotly_chart(fig_ownership_change_country_fig, use_container_width=True)
 
-fig_ownership_change_country_fig = px.bar(ownership_change_country_dynamic_df, x = 'Country', y='cumulative_bp_change_of_ownership', title = f"Cumulative Ownership Change By Country Over {year_selection} Years",
-                                              text_auto= True)
+    ## TOP 10 COMPANIES BY CUMULATIVE OWNERSHIP CHANGE MULTISELECT
 
-fig_ownership_change_country_fig.update_layout(title_x = 0.3)
+    top10_ownership_change_country_dynamic_df = top_companies_by_ownership_change(backend, result_cache, year_selection, country_selection, latest_year)
 
-fig_ownership_change_country_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
+    top10_ownership_change_country_fig = top_companies_figure(top10_ownership_change_country_dynamic_df, year_selection)
 
-st.plotly_chart(fig_ownership_change_country_fig, use_container_width=True)
+    st.plotly_chart(top10_ownership_change_country_fig, use_container_width=True)
 
-## TOP 10 COMPANIES BY CUMULATIVE OWNERSHIP CHANGE MULTISELECT
+country_section()
 
-top10_ownership_change_country_dynamic_df = run_query_dynamic_country('SQL/dynamic/top10_ownership_change_company_multiselect.sql',year_selection,country_selection)
+#Show how the query cache is doing for the current data version
 
-top10_ownership_change_country_fig = px.bar(top10_ownership_change_country_dynamic_df, x = 'Company', y='cumulative_bp_change_of_ownership', title = f"Top 10 Companies By Cumulative Ownership Change - Last {year_selection} Years",
-                                              text_auto= True)
+cache_stats = result_cache.stats()
 
-top10_ownership_change_country_fig.update_layout(title_x = 0.3)
+st.sidebar.caption(f"Data version {cache_stats['version']}. Query cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                   f"{cache_stats['evictions']} evictions, {cache_stats['entries']} entries ({cache_stats['megabytes']} MB).")
 
-top10_ownership_change_country_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
+warm_report = start_cache_warmer(cache_stats['version']).report()
 
-st.plotly_chart(top10_ownership_change_country_fig, use_container_width=True)
\ No newline at end of file
+st.sidebar.caption(f"Preset cache warming: {warm_report['presets_cached']} of {warm_report['presets']} presets and "
+                   f"{warm_report['combinations_cached']} of {warm_report['combinations']} preset and year combinations cached"
+                   + (f", warmed in {warm_report['seconds']}s." if warm_report['seconds'] is not None else ", warming..."))
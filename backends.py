@@ -0,0 +1,314 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Parquet snapshot of the cleaned data written by the ETL (see ETL/staging.py)
+STAGING_DIR = Path(__file__).resolve().parent / 'staging'
+
+# Scripts that build the oil_fund view and the tables derived from the star schema, such as the rollups the dashboard queries read from
+BUILD_SQL_DIR = Path(__file__).resolve().parent / 'SQL' / 'build'
+
+
+# How PostgresBackend transfers results: COPY ... TO STDOUT parsed by Arrow, fetchmany batches into typed columns, or the
+# original fetchall of tuples into a DataFrame
+FETCH_METHODS = ('copy', 'batches', 'fetchall')
+
+# Arrow types of the Postgres type OIDs the queries return, for parsing COPY output. Other types are read as strings.
+POSTGRES_ARROW_TYPES = {16: 'bool_', 20: 'int64', 21: 'int16', 23: 'int32', 700: 'float64', 701: 'float64', 1700: 'float64'}
+
+
+def typed_frame(table):
+    """
+    Converts an Arrow table of query results to a compact pandas DataFrame.
+
+    Strings are dictionary encoded so labels such as country, sector and company names come out as categoricals,
+    decimals become float64 and year becomes int16. The frame is built column by column from Arrow, without a Python
+    object per value.
+
+    Args:
+        table (pyarrow.Table): The query results.
+
+    Returns:
+        pandas.DataFrame: The typed results.
+    """
+
+    columns = []
+
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = column.dictionary_encode()
+        elif pa.types.is_decimal(column.type):
+            column = column.cast(pa.float64())
+        elif name == 'year' and pa.types.is_integer(column.type):
+            column = column.cast(pa.int16())
+        columns.append(column)
+
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pandas()
+
+
+class QueryBackend:
+    """
+    Base class for the query backends. Subclasses implement query, and query_many runs a batch of queries concurrently.
+    """
+
+    max_workers = 8
+
+    def query(self, query, params=None):
+        raise NotImplementedError
+
+    def query_many(self, queries):
+        """
+        Runs a batch of queries at the same time, so the batch takes about as long as its slowest query.
+
+        Args:
+            queries (dict): Mapping of a key to a (query, params) tuple.
+
+        Returns:
+            dict: Mapping of each key to the query result as a pandas DataFrame.
+        """
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(queries), 1))) as executor:
+            futures = {key: executor.submit(self.query, query, params) for key, (query, params) in queries.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+
+class PostgresBackend(QueryBackend):
+    """
+    Runs the SQL files against the Postgres database loaded by the ETL.
+
+    Connections come from a thread safe pool, so concurrent sessions and batches do not queue behind one connection.
+    A connection that has been dropped is discarded and the query is retried once on a fresh connection.
+    The pool raises instead of waiting when every connection is taken, so a semaphore sized to the pool makes queries
+    from other sessions or the cache warmer wait for a free connection.
+
+    Results are materialized into typed columns, see typed_frame. By default they are streamed with COPY ... TO STDOUT,
+    the driver's bulk transfer, and parsed by Arrow's multithreaded CSV reader, so no Python tuple or Decimal is created
+    per value. fetch='batches' reads the cursor with fetchmany into one list per column with NUMERIC cast to float by
+    the driver, and fetch='fetchall' keeps the original path, for comparison in the benchmarks.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, pool_size=8, fetch='copy', batch_size=10000, **connection_params):
+        import psycopg2
+        from psycopg2.extensions import new_type, DECIMAL
+        from psycopg2.pool import ThreadedConnectionPool
+
+        if fetch not in FETCH_METHODS:
+            raise ValueError(f"Unknown fetch method '{fetch}'. Use one of {FETCH_METHODS}.")
+
+        # Typed materialization needs pyarrow, without it results are fetched as before
+        self.fetch = fetch if pa is not None else 'fetchall'
+        self.batch_size = batch_size
+
+        # NUMERIC values are read as floats instead of Decimals
+        self.numeric_as_float = new_type(DECIMAL.values, 'NUMERIC_AS_FLOAT', lambda value, cur: float(value) if value is not None else None)
+
+        self.errors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        self.max_workers = pool_size
+        # No connection is opened until the first query, so an app that starts from published payloads does not wait on the database
+        self.pool = ThreadedConnectionPool(0, pool_size, **connection_params)
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+        # Arrow column types of the COPY output by query text, see copy_query
+        self.column_types = {}
+
+    def query(self, query, params=None, retry=True):
+        with self.slots:
+            return self.run(query, params, retry)
+
+    def run(self, query, params=None, retry=True):
+        conn = self.pool.getconn()
+        try:
+            # The dashboard only reads, so there is no transaction to keep open between queries
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                if self.fetch == 'copy':
+                    df = self.copy_query(cur, query, params)
+                elif self.fetch == 'batches':
+                    df = self.fetch_batches(cur, query, params)
+                else:
+                    cur.execute(query, params)
+                    df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        except self.errors:
+            self.pool.putconn(conn, close=True)
+            if retry:
+                # The retry reuses the slot this query already holds
+                return self.run(query, params, retry=False)
+            raise
+        except Exception:
+            self.pool.putconn(conn)
+            raise
+        self.pool.putconn(conn)
+        return df
+
+    def copy_query(self, cur, query, params=None):
+        # COPY takes no parameters, so they are bound on the client first with the driver's own quoting
+        bound = cur.mogrify(query, params).decode().strip().rstrip(';')
+
+        # The column types come from the query's result description instead of being guessed from the text, which would read
+        # a label that looks like a number as a number and fail on a column that starts with NULLs. The parameters do not
+        # change the types, so the description is only queried the first time a SQL file runs and kept by its unbound text.
+        column_types = self.column_types.get(query)
+
+        if column_types is None:
+            cur.execute(f"SELECT * FROM ({bound}) AS result LIMIT 0")
+            column_types = {desc[0]: getattr(pa, POSTGRES_ARROW_TYPES.get(desc[1], 'string'))() for desc in cur.description}
+            self.column_types[query] = column_types
+
+        buffer = io.BytesIO()
+        cur.copy_expert(f"COPY ({bound}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+        buffer.seek(0)
+
+        # Postgres writes booleans as t and f, NULL as an empty field and an empty string as ""
+        table = pa_csv.read_csv(buffer, convert_options=pa_csv.ConvertOptions(column_types=column_types, true_values=['t'], false_values=['f'],
+                                                                              strings_can_be_null=True, quoted_strings_can_be_null=False))
+
+        return typed_frame(table)
+
+    def fetch_batches(self, cur, query, params=None):
+        from psycopg2.extensions import register_type
+
+        register_type(self.numeric_as_float, cur)
+
+        cur.execute(query, params)
+
+        names = [desc[0] for desc in cur.description]
+        columns = [[] for _ in names]
+
+        while True:
+            rows = cur.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for column, values in zip(columns, zip(*rows)):
+                column.extend(values)
+
+        return typed_frame(pa.Table.from_arrays([pa.array(column) for column in columns], names=names))
+
+
+class DuckDBBackend(QueryBackend):
+    """
+    Runs the same SQL files in process with DuckDB, against the Parquet snapshot in the staging directory.
+
+    Every dataset in the staging directory is exposed as a view with the same name, so oil_fund_fact resolves to the
+    version of staging/oil_fund_fact named by its pointer file and each dimension table to its Parquet file. The SQL/build
+    scripts are then run to create the same oil_fund view and derived tables the ETL builds in Postgres. Both are built
+    again when a new load is staged, see refresh.
+    No database service is needed and the whole table is scanned in memory.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, staging_dir=STAGING_DIR, fetch='arrow'):
+        # 'arrow' transfers results as Arrow and types them with typed_frame, 'df' is DuckDB's own DataFrame conversion
+        self.fetch = fetch if pa is not None else 'df'
+
+        self.staging_dir = Path(staging_dir)
+        self.lock = threading.Lock()
+
+        # The views and tables are built by the first query, so an app that starts from published payloads does not wait on them
+        self.staged = None
+        self.conn = None
+
+    def staged_version(self):
+        # Every load replaces the pointer files of the datasets and the Parquet tables, so their modification times change with it
+        return tuple((path.name, path.stat().st_mtime_ns) for path in sorted(self.staging_dir.iterdir())
+                     if path.suffix in ('.current', '.parquet') or (path.is_dir() and not path.suffix))
+
+    def build(self):
+        """
+        Creates a connection with a view over every staged dataset and the tables of the SQL/build scripts.
+
+        Returns:
+            duckdb.DuckDBPyConnection: The connection.
+        """
+
+        import duckdb
+
+        conn = duckdb.connect()
+
+        for path in sorted(self.staging_dir.iterdir()):
+            if path.suffix == '.current':
+                # The pointer file of a dataset names the version directory that is current
+                dataset = self.staging_dir / path.read_text().strip()
+                source = f"read_parquet('{(dataset / '**' / '*.parquet').as_posix()}', hive_partitioning = true)"
+            elif path.is_dir() and not path.suffix and not path.with_suffix('.current').exists():
+                source = f"read_parquet('{(path / '**' / '*.parquet').as_posix()}', hive_partitioning = true)"
+            elif path.suffix == '.parquet':
+                source = f"read_parquet('{path.as_posix()}')"
+            else:
+                continue
+            conn.execute(f"CREATE VIEW {path.stem} AS SELECT * FROM {source}")
+
+        for path in sorted(BUILD_SQL_DIR.glob('*.sql')):
+            for statement in path.read_text().split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+
+        return conn
+
+    def refresh(self):
+        """
+        Rebuilds the views and tables when the ETL has staged a new load since they were built.
+
+        The backend lives for as long as the app, so without this it would keep serving the load it was created with. The
+        new connection is built next to the current one and swapped in, so queries that are running finish on the old load.
+        The first query builds the first connection.
+        """
+
+        staged = self.staged_version()
+
+        if staged == self.staged:
+            return
+
+        with self.lock:
+            if staged != self.staged:
+                self.conn = self.build()
+                self.staged = staged
+
+    def query(self, query, params=None):
+        # The SQL files use psycopg2's %s placeholders, DuckDB uses ?
+        query = query.replace('%s', '?')
+
+        self.refresh()
+
+        # Each call gets its own cursor so concurrent sessions do not share one connection state. Results are transferred as Arrow.
+        with self.conn.cursor() as cur:
+            if self.fetch == 'df':
+                return cur.execute(query, list(params or [])).df()
+            result = cur.execute(query, list(params or [])).arrow()
+
+        # Newer DuckDB versions return a record batch reader instead of a table
+        return typed_frame(result.read_all() if hasattr(result, 'read_all') else result)
+
+
+def create_backend(name=None, **connection_params):
+    """
+    Creates the query backend named by the OIL_FUND_BACKEND environment variable, or by name if it is given.
+
+    Args:
+        name (str): 'postgres' (the default) or 'duckdb'.
+        connection_params: Connection parameters passed to psycopg2 for the postgres backend.
+
+    Returns:
+        PostgresBackend or DuckDBBackend: The query backend.
+    """
+
+    name = name or os.environ.get('OIL_FUND_BACKEND', 'postgres')
+
+    if name == 'duckdb':
+        return DuckDBBackend(Path(os.environ.get('OIL_FUND_STAGING_DIR', STAGING_DIR)))
+
+    if name == 'postgres':
+        return PostgresBackend(**connection_params)
+
+    raise ValueError(f"Unknown query backend '{name}'. Use 'postgres' or 'duckdb'.")
@@ -0,0 +1,148 @@
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Writes synthetic EQ_YYYY_Country.csv and FI_YYYY_Country.csv files in the same format as the NBIM files in data/.
+# At scale 1 the files have about as many rows as the real data. Some companies appear under slightly different names in
+# different years, the same way the real files spell a company differently from one year to the next, some of them only
+# close enough to be merged by the fuzzy scoring of the name matcher.
+
+EQ_COLUMNS = ['Region', 'Country', 'Name', 'Industry', 'Market Value(NOK)', 'Market Value(USD)', 'Voting', 'Ownership', 'Incorporation Country']
+FI_COLUMNS = ['Region', 'Country', 'Name', 'Industry', 'Market Value(NOK)', 'Market Value(USD)', 'Incorporation Country']
+
+COUNTRIES = {
+'North America': ['United States', 'Canada', 'Bermuda'],
+'Europe': ['United Kingdom', 'France', 'Germany', 'Switzerland', 'Sweden', 'Netherlands', 'Spain', 'Italy', 'Denmark', 'Finland',
+           'Guernsey C. I.', 'Faeroe Islands'],
+'Asia': ['Japan', 'China', 'Hong Kong', 'Taiwan', 'South Korea', 'India', 'Singapore', 'Malaysia'],
+'Oceania': ['Australia', 'New Zealand'],
+'Latin America': ['Brazil', 'Mexico', 'Chile', 'Trinidad And Tobago'],
+'Middle East': ['Israel', 'Saudi Arabia', 'United Arab Emirates'],
+'Africa': ['South Africa', 'Egypt', 'Tanzania *, United Republic of']}
+
+EQ_SECTORS = ['Basic Materials', 'Consumer Discretionary', 'Consumer Staples', 'Energy', 'Financials', 'Health Care', 'Industrials',
+              'Real Estate', 'Technology', 'Telecommunications', 'Utilities', 'Consumer Services', 'Consumer Goods', 'Oil & Gas', 'Unknown']
+
+FI_SECTORS = ['Corporate Bonds', 'Government Bonds', 'Securitized Bonds', 'Treasuries', 'Corporate', 'Government Related',
+              'Treasuries/Index Linked Bonds', 'Securitized', 'Convertible Bonds']
+
+WORDS = ['Alpha', 'Nordic', 'Pacific', 'Global', 'United', 'First', 'Capital', 'Energy', 'Mining', 'Digital', 'Health', 'Power', 'Steel',
+         'Atlantic', 'Royal', 'Green', 'Silver', 'Summit', 'Harbor', 'Union', 'National', 'General', 'Metro', 'Delta', 'Apex', 'Bright']
+
+SUFFIXES = ['Ltd', 'Inc', 'AG', 'SA', 'PLC', 'ASA', 'Corp', 'NV', 'AB', 'Holdings Ltd', 'Group Inc']
+
+YEARS = range(1998, 2023)
+
+
+# Abbreviations the NBIM files use for some words of a company name
+ABBREVIATIONS = {'Holdings': 'Hldgs', 'Group': 'Grp', 'Corp': 'Corporation', 'Capital': 'Cap', 'National': 'Natl',
+                 'General': 'Genl', 'International': 'Intl'}
+
+
+def near_duplicate(name, rng):
+    # Variants that make the same company look different. The first four reduce to the same match key as the name: punctuation,
+    # case, word order and a doubled space. The others only match fuzzily: a typo, a dropped suffix and an abbreviation.
+    variant = rng.integers(7)
+    if variant == 0:
+        return name.replace('Ltd', 'Ltd.') if 'Ltd' in name else name + '.'
+    if variant == 1:
+        return name.upper()
+    if variant == 2:
+        words = name.split()
+        return ' '.join(words[1:] + words[:1])
+    if variant == 3:
+        return name.replace(' ', '  ', 1)
+    if variant == 5:
+        for suffix in sorted(SUFFIXES, key=len, reverse=True):
+            if f' {suffix} ' in name:
+                return name.replace(f' {suffix} ', ' ', 1)
+    if variant == 6:
+        for word, abbreviation in ABBREVIATIONS.items():
+            if word in name.split():
+                return name.replace(word, abbreviation, 1)
+    # A typo, two neighbouring letters of the first word swapped. Also used when there is no suffix or word to abbreviate.
+    first, _, rest = name.partition(' ')
+    i = rng.integers(len(first) - 1)
+    return f"{first[:i]}{first[i + 1]}{first[i]}{first[i + 2:]} {rest}"
+
+
+def make_companies(n, sectors, rng, prefix=''):
+    regions = list(COUNTRIES)
+    region = rng.choice(regions, size=n)
+    country = [rng.choice(COUNTRIES[r]) for r in region]
+    words = rng.choice(WORDS, size=(n, 2))
+    suffix = rng.choice(SUFFIXES, size=n)
+    names = [f"{prefix}{a} {b} {s} {i}" for i, ((a, b), s) in enumerate(zip(words, suffix))]
+
+    return pd.DataFrame({'Region': region,
+                         'Country': country,
+                         'Name': names,
+                         'Industry': rng.choice(sectors, size=n),
+                         # The fund starts with fewer holdings and adds more every year
+                         'first_year': np.where(rng.random(n) < 0.3, YEARS[0], rng.integers(YEARS[0], YEARS[-1] + 1, size=n)),
+                         'base_value': rng.lognormal(16, 1.5, size=n)})
+
+
+def generate(output_dir, scale=1, seed=0, duplicate_rate=0.05):
+    """
+    Writes one EQ and one FI file per year to output_dir.
+
+    Args:
+        output_dir (str or pathlib.Path): The directory to write the files to.
+        scale (int): Multiplies the number of companies. Scale 1 is about the size of the real data.
+        seed (int): Seed of the random number generator.
+        duplicate_rate (float): Share of rows that use a near duplicate of the company name.
+
+    Returns:
+        int: The number of rows written.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    equities = make_companies(9000 * scale, EQ_SECTORS, rng)
+    bonds = make_companies(2500 * scale, FI_SECTORS, rng, prefix='Bond ')
+
+    rows = 0
+
+    for year in YEARS:
+        for category, companies, columns in (('EQ', equities, EQ_COLUMNS), ('FI', bonds, FI_COLUMNS)):
+            df = companies[companies['first_year'] <= year].copy()
+
+            growth = 1.08 ** (year - YEARS[0])
+            df['Market Value(USD)'] = (df['base_value'] * growth * rng.lognormal(0, 0.2, size=len(df))).astype(np.int64)
+            df['Market Value(NOK)'] = (df['Market Value(USD)'] * rng.uniform(6, 11)).astype(np.int64)
+
+            if category == 'EQ':
+                df['Ownership'] = np.round(rng.gamma(1.5, 0.8, size=len(df)), 2)
+                df['Voting'] = df['Ownership']
+
+            df['Incorporation Country'] = df['Country']
+
+            duplicates = rng.random(len(df)) < duplicate_rate
+            df.loc[duplicates, 'Name'] = [near_duplicate(name, rng) for name in df.loc[duplicates, 'Name']]
+
+            # The NBIM files write market values with thousands separators, quoted because of the commas
+            for col in ('Market Value(USD)', 'Market Value(NOK)'):
+                df[col] = df[col].map('{:,}'.format)
+
+            df[columns].to_csv(output_dir / f'{category}_{year}_Country.csv', index=False)
+
+            rows += len(df)
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_dir')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate(args.output_dir, args.scale, args.seed)
+
+    print(f"Wrote {rows} rows at scale {args.scale} to {args.output_dir}.")
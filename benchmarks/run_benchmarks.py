@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import streamlit as st
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT / 'ETL'))
+sys.path.append(str(ROOT))
+
+from generate_data import generate
+from etl import extract_data, transform_data, clean_data, load_data, create_db_engine
+from incremental import build_manifest
+from instrumentation import Metrics, sampled_rss, round_mb
+from layout import EXPLAIN_PARAMS, explain_sql_files
+from transform import Transformations
+from backends import FETCH_METHODS, PostgresBackend, DuckDBBackend
+from cumulative_change import yearly_query
+from query_cache import ResultCache
+
+# Times and measures the memory of every ETL stage, and every SQL file against a local database, on synthetic data at several
+# scales, and how query results are materialized by each backend. Results are written as JSON to benchmarks/results so
+# runs can be compared.
+#
+# Loading, with both the COPY and INSERT load methods, and the SQL timings only run with --database, which loads into
+# the database in .streamlit/secrets.toml.
+# Point it at a throwaway local database: the benchmark replaces oil_fund and its derived tables.
+
+# Threshold of the fuzzy name matching runs, low enough to merge the typos, dropped suffixes and abbreviations of generate_data
+FUZZY_THRESHOLD = 90
+
+
+def measure(name, results, func, *args, **kwargs):
+    """
+    Runs func, recording its wall-clock time and the resident set size of the process before it ran and at its peak.
+    """
+
+    # Sampling the RSS leaves the timings as they are, where tracing every allocation would slow the stages down
+    with sampled_rss() as rss:
+        start = time.perf_counter()
+
+        output = func(*args, **kwargs)
+
+        seconds = time.perf_counter() - start
+
+    rows = len(output) if hasattr(output, '__len__') and not isinstance(output, (str, dict)) else None
+
+    results.append({'stage': name, 'seconds': round(seconds, 3), 'rss_start_mb': round_mb(rss['start']),
+                    'peak_rss_mb': round_mb(rss['peak']), 'rows': rows})
+
+    print(f"  {name}: {seconds:.2f}s, peak RSS {round_mb(rss['peak'])} MB (from {round_mb(rss['start'])} MB)")
+
+    return output
+
+
+def materialization_queries(params=EXPLAIN_PARAMS):
+    # Every static and dynamic SQL file and the company yearly query, with the same parameters as explain_sql_files
+    queries = {}
+
+    for path in sorted((ROOT / 'SQL').glob('static/**/*.sql')) + sorted((ROOT / 'SQL').glob('dynamic/*.sql')):
+        query = path.read_text()
+        key = path.relative_to(ROOT / 'SQL').as_posix()
+
+        if '{}' in query:
+            countries = params['countries']
+            query = query.format(','.join(['%s'] * len(countries)))
+            queries[key] = (query, (params['num_years'], *countries) if query.count('%s') > len(countries) else tuple(countries))
+        else:
+            queries[key] = (query, None)
+
+    queries['templates/yearly_by_dimension.sql:company'] = yearly_query('company', params['num_years'])
+
+    return queries
+
+
+def benchmark_materialization(name, backend, queries, results):
+    """
+    Runs every query on backend and records how long the results take to fetch, how much memory the DataFrame and its
+    query cache entry take, and how long the cached entry and a pickled copy of the frame take to read back.
+
+    Every query is fetched twice on a fresh backend. The first fetch includes any per query setup, such as the type
+    lookup of the COPY path, and the second is the steady state of a running app.
+
+    Returns:
+        dict: The totals over every query.
+    """
+
+    totals = {'first_seconds': 0, 'seconds': 0, 'frame_mb': 0, 'cache_mb': 0, 'pickle_mb': 0, 'unpickle_seconds': 0, 'cache_read_seconds': 0}
+
+    for key, (query, params) in queries.items():
+        start = time.perf_counter()
+        backend.query(query, params)
+        first_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = backend.query(query, params)
+        seconds = time.perf_counter() - start
+
+        packed, cache_bytes = ResultCache.pack(df)
+        pickled = pickle.dumps(df)
+
+        start = time.perf_counter()
+        pickle.loads(pickled)
+        unpickle_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ResultCache.unpack(packed)
+        cache_read_seconds = time.perf_counter() - start
+
+        record = {'first_seconds': first_seconds,
+                  'seconds': seconds,
+                  'frame_mb': int(df.memory_usage(deep=True).sum()) / 1024 ** 2,
+                  'cache_mb': cache_bytes / 1024 ** 2,
+                  'pickle_mb': len(pickled) / 1024 ** 2,
+                  'unpickle_seconds': unpickle_seconds,
+                  'cache_read_seconds': cache_read_seconds}
+
+        for metric, value in record.items():
+            totals[metric] += value
+
+        results.append({'stage': f'materialize:{name}', 'query': key, 'rows': len(df), **{metric: round(value, 4) for metric, value in record.items()}})
+
+    print(f"  materialize {name}: {totals['first_seconds']:.2f}s first, {totals['seconds']:.2f}s after, frames {totals['frame_mb']:.1f} MB, cache {totals['cache_mb']:.1f} MB, "
+          f"pickles {totals['pickle_mb']:.1f} MB read in {totals['unpickle_seconds']:.3f}s")
+
+    return totals
+
+
+def benchmark_scale(scale, work_dir, database=False):
+    data_dir = work_dir / f'data_x{scale}'
+    staging_dir = work_dir / f'staging_x{scale}'
+    dictionary_path = work_dir / f'canonical_names_x{scale}.csv'
+
+    if not data_dir.exists():
+        print(f"Generating data at scale {scale}.")
+        generate(data_dir, scale)
+
+    results = []
+
+    cwd = os.getcwd()
+
+    try:
+        raw = measure('extract_data', results, extract_data, data_dir)
+        manifest = build_manifest()
+
+        transformed = measure('transform_data', results, transform_data, raw.copy(), staging_dir, dictionary_path)
+
+        # Name matching on its own, on the cleaned names before they were merged, first with an empty canonical name
+        # dictionary and then with the one it just filled. The default threshold only merges names with the same match
+        # key, so the matching also runs at FUZZY_THRESHOLD, which scores the distinct keys of every block.
+        cleaned = clean_data(raw.copy(), Metrics())
+
+        for label, threshold in (('', 100), ('_fuzzy', FUZZY_THRESHOLD)):
+            with tempfile.TemporaryDirectory(prefix='oil_fund_names_') as names_dir:
+                for run in ('cold', 'warm'):
+                    trans = Transformations(threshold, dictionary_path=Path(names_dir) / 'canonical_names.csv')
+                    measure(f'merge_similar_strings{label}_{run}', results, trans.merge_similar_strings, cleaned.copy(), 'name')
+                    results[-1].update(comparisons=trans.merge_stats['comparisons'], merged=trans.merge_stats['merged'])
+
+        if database:
+            # Full loads with each --load-method, compared by the rows per second of the partition upload. COPY runs
+            # last so the SQL timings below run against the table it loaded.
+            for method in ('insert', 'copy'):
+                metrics = Metrics()
+                measure(f'load_data_{method}', results, load_data, transformed, manifest, True, method, staging_dir, metrics)
+
+                partitions = next(record for record in metrics.stages if record['stage'] == 'load_partitions')
+                results[-1].update(rows=partitions['rows_out'], load_partitions_seconds=partitions['seconds'],
+                                   rows_per_second=round(partitions['rows_out'] / partitions['seconds']))
+
+                print(f"  load_partitions {method}: {results[-1]['rows_per_second']:,} rows/s")
+
+            for row in explain_sql_files(create_db_engine()).to_dict('records'):
+                results.append({'stage': 'sql', **row})
+
+            # Typed result materialization against the original fetchall path, and the same for DuckDB over the staged data
+            queries = materialization_queries()
+
+            totals = {fetch: benchmark_materialization(f'postgres_{fetch}', PostgresBackend(fetch=fetch, **st.secrets["postgres"]), queries, results)
+                      for fetch in FETCH_METHODS}
+
+            # COPY runs a type lookup the first time each query is seen, so it is compared with fetchall on first fetches too
+            copy_speedup = {timing: totals['fetchall'][timing] / totals['copy'][timing] for timing in ('first_seconds', 'seconds')}
+
+            results.append({'stage': 'materialize:copy_vs_fetchall', **{f'{timing}_speedup': round(speedup, 2) for timing, speedup in copy_speedup.items()}})
+
+            print(f"  COPY against fetchall: {copy_speedup['first_seconds']:.2f}x on first fetches, including the type lookup, "
+                  f"{copy_speedup['seconds']:.2f}x after")
+
+            for fetch in ('arrow', 'df'):
+                benchmark_materialization(f'duckdb_{fetch}', DuckDBBackend(staging_dir, fetch=fetch), queries, results)
+    finally:
+        os.chdir(cwd)
+
+    return {'scale': scale, 'rows': len(raw), 'stages': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--work-dir', default=None, help='Where to keep the generated data. Defaults to a temporary directory.')
+    parser.add_argument('--database', action='store_true', help='Also benchmark load_data and the SQL files against the database')
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='oil_fund_bench_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    runs = []
+
+    for scale in args.scales:
+        print(f"Scale {scale}:")
+        runs.append(benchmark_scale(scale, work_dir, args.database))
+
+    output_dir = Path(__file__).resolve().parent / 'results'
+    output_dir.mkdir(exist_ok=True)
+
+    output_path = output_dir / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+
+    output_path.write_text(json.dumps({'created': datetime.now(timezone.utc).isoformat(), 'runs': runs}, indent=2))
+
+    print(f"Results saved to {output_path}.")
@@ -0,0 +1,179 @@
+import plotly.express as px
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+
+# Figure builders for every chart in the app. Each takes the query results it plots and returns a plotly figure,
+# so the figures that only depend on the loaded data can be built once per data version and shared by every session.
+
+# Create a dictionary of colors for each sector
+equity_colors = {'Basic Materials': '#FFA07A',
+                 'Consumer Discretionary': '#20B2AA',
+                 'Consumer Staples': '#87CEFA',
+                 'Energy': '#B0E0E6',
+                 'Financials': '#7B68EE',
+                 'Health Care': '#FF7F50',
+                 'Industrials': '#6495ED',
+                 'Real Estate': '#9ACD32',
+                 'Technology': '#F08080',
+                 'Telecommunications': '#DDA0DD',
+                 'Utilities': '#00FFFF'}
+
+fixed_income_colors = {'Corporate Bonds': '#FFD700',
+                       'Government Bonds': '#CD5C5C',
+                       'Securitized Bonds': '#ADFF2F',
+                       'Treasuries': '#2F4F4F'}
+
+
+def eq_fi_figure(equity_fi_df):
+    # Plot the data using plotly
+    eq_fi_fig = px.line(equity_fi_df, x='year', y=['Equity Proportion', 'Fixed Income Proportion'], markers=True)
+    eq_fi_fig.update_traces(mode="markers+lines", hovertemplate=None)
+
+    # Update the plotly figure object layout
+    eq_fi_fig.update_layout(title='Equity and Fixed Income Proportions Over Time', title_x = 0.4, xaxis_title='Year', yaxis_title='Proportion Of Fund (%)',
+                            hovermode="x unified", legend_title = "")
+
+    return eq_fi_fig
+
+
+def sector_proportions_figure(sector_prop_df):
+    # Initialize figure with subplots
+    sector_prop_fig = make_subplots(rows=2, cols=1, subplot_titles=("Equity Investments", "Fixed Income Investments"))
+
+    # Create line plots for each sector within each category. One groupby splits the rows instead of filtering the frame
+    # once per category and once per sector.
+    categories = list(sector_prop_df['category'].unique())
+
+    groups = sorted(sector_prop_df.groupby(['category', 'Sector'], sort=False, observed=True), key=lambda group: categories.index(group[0][0]))
+
+    for (category, sector), sector_data in groups:
+        i = categories.index(category)
+        if category == 'Equity':
+            sector_prop_fig.add_trace(go.Scatter(x=sector_data['year'], y=sector_data['Proportion of Fund'],
+                                     mode='lines+markers', name=sector,
+                                     line=dict(color=equity_colors[sector]), showlegend=i==0), row=i+1, col=1)
+        else:
+            sector_prop_fig.add_trace(go.Scatter(x=sector_data['year'], y=sector_data['Proportion of Fund'],
+                                     mode='lines+markers', name=sector,
+                                     line=dict(color=fixed_income_colors[sector]), showlegend=True), row=i+1, col=1)
+
+    # Update xaxis and yaxis properties
+    sector_prop_fig.update_xaxes(title_text='Year', row=2, col=1)
+    sector_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)', row=1, col=1)
+    sector_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)', row=2, col=1)
+
+    # Update subplot titles
+    sector_prop_fig.update_layout(title='Sector and Fixed Income Proportions Over Time', height=800, margin=dict(t=120), title_x = 0.35)
+
+    # Set subplot titles
+    sector_prop_fig.update_annotations(
+        {'text': 'Equity Investments', 'font': {'size': 24}, 'x': 0.5, 'y': 1.05, 'showarrow': False},
+        {'text': 'Fixed Income Investments', 'font': {'size': 24}, 'x': 0.5, 'y': 1.05, 'showarrow': False}
+    )
+
+    # Show legend for each subplot
+    sector_prop_fig.update_layout(showlegend=True)
+
+    return sector_prop_fig
+
+
+def region_proportions_figure(region_prop_df):
+    region_prop_fig = px.line(region_prop_df, x="year", y="proportion", color="Region", title="Proportion of Fund By Region Over Time", markers=True)
+
+    region_prop_fig.update_layout(title_x=0.3)
+    region_prop_fig.update_xaxes(title_text='Year')
+    region_prop_fig.update_yaxes(title_text='Proportion Of Fund (%)')
+
+    return region_prop_fig
+
+
+def sector_ownership_figure(sector_ownership_df):
+    sector_ownership_fig = px.line(sector_ownership_df, x="year", y="avg_percent_ownership", color="Sector", title="Average Ownership By Sector Over Time", markers=True)
+
+    sector_ownership_fig.update_layout(title_x=0.3)
+    sector_ownership_fig.update_xaxes(title_text='Year')
+    sector_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
+
+    return sector_ownership_fig
+
+
+def sector_ownership_change_figure(cum_owner_change_sector_10_df):
+    cum_owner_change_sector_10_fig = px.bar(cum_owner_change_sector_10_df, x = 'Sector', y='cumulative_bp_change_of_ownership', title= "Cumulative Change In Average Ownership By Sector - Last 10 Years",
+                                                  text_auto= True)
+
+    cum_owner_change_sector_10_fig.update_layout(title_x=0.3)
+    cum_owner_change_sector_10_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
+
+    return cum_owner_change_sector_10_fig
+
+
+def sector_ownership_market_value_figure(mrkt_value_ownership_change_sector_ten_years_df):
+    mrkt_value_ownership_change_sector_ten_years_df = mrkt_value_ownership_change_sector_ten_years_df.rename(
+        columns={'cumulative_bp_change_of_ownership': 'Cumulative Average Ownership Change',
+                 'cumulative_change_mrkt_value': 'Cumulative Market Value Percent Change'})
+
+    mrkt_value_ownership_change_sector_ten_years_fig = px.scatter(mrkt_value_ownership_change_sector_ten_years_df,
+                                                                  x= 'Cumulative Average Ownership Change', y= 'Cumulative Market Value Percent Change',
+                                                                  color='Sector',
+                                                                  title="Cumulative Change In Ownership and Market Value By Sector - Last 10 Years")
+
+    mrkt_value_ownership_change_sector_ten_years_fig.update_traces(marker_size=10)
+    mrkt_value_ownership_change_sector_ten_years_fig.update_layout(title_x=0.3, showlegend=False)
+    mrkt_value_ownership_change_sector_ten_years_fig.update_xaxes(title_text='Cumulative Change In Average Ownership (Basis Points)')
+    mrkt_value_ownership_change_sector_ten_years_fig.update_yaxes(title_text='Cumulative Change In Market Value (%)')
+
+    return mrkt_value_ownership_change_sector_ten_years_fig
+
+
+def region_ownership_figure(region_ownership_df):
+    region_ownership_fig = px.line(region_ownership_df, x="year", y="avg_percent_ownership", color="Region", title="Average Ownership By Region Over Time", markers=True)
+
+    region_ownership_fig.update_layout(title_x=0.3)
+    region_ownership_fig.update_xaxes(title_text='Year')
+    region_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
+
+    return region_ownership_fig
+
+
+def msci_ownership_figure(MSCI_ownership_df):
+    MSCI_ownership_fig = px.line(MSCI_ownership_df, x="year", y="avg_percent_ownership", color="msci_market", title="Average Ownership By MSCI Market Type Over Time", markers=True)
+
+    MSCI_ownership_fig.update_layout(title_x=0.3, hovermode="x unified", legend_title = "")
+    MSCI_ownership_fig.update_xaxes(title_text='Year')
+    MSCI_ownership_fig.update_yaxes(title_text='Average Ownership (%)')
+    MSCI_ownership_fig.update_traces(mode="markers+lines", hovertemplate=None)
+
+    return MSCI_ownership_fig
+
+
+def avg_ownership_country_figure(avg_ownership_country_dynamic_df, year_selection):
+    avg_ownership_country_dynamic_fig = px.line(avg_ownership_country_dynamic_df, x="year", y="avg_percent_ownership", color="Country", title=f"Average Ownership By Country Over {year_selection} Years", markers=True)
+
+    avg_ownership_country_dynamic_fig.update_layout(title_x = 0.3, xaxis = dict(tickmode='array',tickvals = avg_ownership_country_dynamic_df['year'])) #Prevents plotly from adjusting the xaxis values.
+    avg_ownership_country_dynamic_fig.update_xaxes(title_text='Year')
+    avg_ownership_country_dynamic_fig.update_yaxes(title_text='Average Ownership (%)')
+
+    return avg_ownership_country_dynamic_fig
+
+
+def ownership_change_country_figure(ownership_change_country_dynamic_df, year_selection):
+    fig_ownership_change_country_fig = px.bar(ownership_change_country_dynamic_df, x = 'Country', y='cumulative_bp_change_of_ownership', title = f"Cumulative Ownership Change By Country Over {year_selection} Years",
+                                                  text_auto= True)
+
+    fig_ownership_change_country_fig.update_layout(title_x = 0.3)
+
+    fig_ownership_change_country_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
+
+    return fig_ownership_change_country_fig
+
+
+def top_companies_figure(top10_ownership_change_country_dynamic_df, year_selection):
+    top10_ownership_change_country_fig = px.bar(top10_ownership_change_country_dynamic_df, x = 'Company', y='cumulative_bp_change_of_ownership', title = f"Top 10 Companies By Cumulative Ownership Change - Last {year_selection} Years",
+                                                  text_auto= True)
+
+    top10_ownership_change_country_fig.update_layout(title_x = 0.3)
+
+    top10_ownership_change_country_fig.update_yaxes(title_text='Cumulative Change In Ownership (Basis Points)')
+
+    return top10_ownership_change_country_fig
+
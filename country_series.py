@@ -0,0 +1,158 @@
+import pandas as pd
+from cumulative_change import running_change
+
+# Members of the preset country groups
+COUNTRY_GROUPS_PATH = 'SQL/static/country_groups.sql'
+
+# Yearly ownership totals of each country, and the yearly ownership change of every company in each country, over every year
+COUNTRY_SERIES_PATH = 'SQL/dynamic/country_yearly_ownership.sql'
+COMPANY_SERIES_PATH = 'SQL/dynamic/company_yearly_delta.sql'
+
+# The preset country groups of Part 3, by the country_dim column that flags their members
+COUNTRY_GROUPS = {'G7 Countries': 'in_g7',
+                  'G20 Countries': 'in_g20',
+                  'NATO Countries': 'in_nato',
+                  'APEC Countries': 'in_apec',
+                  'MSCI Developed Countries': 'in_msci_developed',
+                  'MSCI Emerging Markets': 'in_msci_emerging',
+                  'MSCI Latin America Countries': 'in_msci_latin_america'}
+
+
+def group_countries(country_groups_df, group):
+    # The members of a preset group, from the result of SQL/static/country_groups.sql
+    return country_groups_df.loc[country_groups_df[COUNTRY_GROUPS[group]].astype(bool), 'country'].tolist()
+
+
+def fetch_per_country(backend, cache, query_path, countries, version=None):
+    """
+    Returns the rows of a per country query for the selected countries, caching the rows of each country separately.
+
+    Only the countries that are not cached yet are sent to the database, in one query, so adding a country to the
+    selection costs one small query instead of re-running the query for the whole selection.
+
+    Args:
+        backend (QueryBackend): The query backend.
+        cache (ResultCache): The query result cache.
+        query_path (str): Path of a SQL file with an IN ({}) placeholder for the countries and a "Country" column.
+        countries (list): The selected countries, without duplicates.
+        version (str): The data version the rows are fetched for. They are not cached if the cache has moved on to another version.
+
+    Returns:
+        pandas.DataFrame: The rows of every selected country.
+    """
+
+    results = {country: cache.get((query_path, country)) for country in countries}
+
+    missing = [country for country, df in results.items() if df is None]
+
+    if missing:
+        results.update(query_countries(backend, cache, query_path, missing, version))
+
+    if not results:
+        return None
+
+    return pd.concat(list(results.values()), ignore_index=True)
+
+
+def query_countries(backend, cache, query_path, countries, version=None):
+    """
+    Runs a per country query for the given countries in one query and caches the rows of each country, without reading
+    the cache first. Used by fetch_per_country for the countries it is missing and by the cache warmer.
+
+    Returns:
+        dict: The rows of each country.
+    """
+
+    with open(query_path, 'r') as file:
+        query = file.read().format(','.join(['%s'] * len(countries)))
+
+    fetched = backend.query(query, tuple(countries))
+
+    results = {}
+
+    for country, df in fetched.groupby('Country', sort=False, observed=True):
+        # Each country keeps only its own labels, not the categories of every country in the query
+        results[country] = df.reset_index(drop=True).apply(lambda col: col.cat.remove_unused_categories() if isinstance(col.dtype, pd.CategoricalDtype) else col)
+
+    # Countries with no rows are cached as empty frames so they are not queried again
+    for country in countries:
+        if country not in results:
+            results[country] = fetched.head(0)
+        cache.put((query_path, country), results[country], version)
+
+    return results
+
+
+def year_window(df, num_years, latest_year):
+    # Same window as the SQL files: year > latest_year - (num_years + 1)
+    return df[df['year'] > latest_year - (num_years + 1)]
+
+
+def cumulative_change_frame(df, key, value, latest_year):
+    # The cumulative change of each key as a frame, largest first, using the same running change as the cumulative change engine
+    change = running_change(df, key, value, latest_year).rename('cumulative_bp_change_of_ownership')
+    return change.reset_index().sort_values('cumulative_bp_change_of_ownership', ascending=False).reset_index(drop=True)
+
+
+def avg_ownership_by_country(backend, cache, num_years, countries, latest_year):
+    """
+    Average ownership of each selected country in every year of the window.
+    """
+
+    series = fetch_per_country(backend, cache, COUNTRY_SERIES_PATH, countries)
+
+    if series is None:
+        return pd.DataFrame(columns=['year', 'Country', 'avg_percent_ownership'])
+
+    series = year_window(series, num_years, latest_year)
+
+    avg = (series['ownership_sum'].astype(float) / series['ownership_count'].astype(float)).round(2)
+
+    return series[['year', 'Country']].assign(avg_percent_ownership=avg).sort_values('year', kind='stable').reset_index(drop=True)
+
+
+def ownership_change_by_country(backend, cache, num_years, countries, latest_year):
+    """
+    Cumulative change in average ownership of each selected country over the window.
+    """
+
+    series = fetch_per_country(backend, cache, COUNTRY_SERIES_PATH, countries)
+
+    if series is None:
+        return pd.DataFrame(columns=['Country', 'cumulative_bp_change_of_ownership'])
+
+    series = year_window(series, num_years, latest_year)
+
+    series = series.assign(avg_percent_ownership=series['ownership_sum'].astype(float) / series['ownership_count'].astype(float))
+
+    return cumulative_change_frame(series, 'Country', 'avg_percent_ownership', latest_year)
+
+
+def top_companies_by_ownership_change(backend, cache, num_years, countries, latest_year, n=10, bottom=False):
+    """
+    The n companies in the selected countries with the largest cumulative change in ownership over the window, or the
+    smallest with bottom=True.
+
+    The rows are the yearly deltas of company_year_delta, so the change over any window is the sum of the rows whose
+    previous year is inside the window. Companies with the same change are ranked by name, so the ranking does not
+    depend on the order the rows were fetched or cached in.
+    """
+
+    series = fetch_per_country(backend, cache, COMPANY_SERIES_PATH, countries)
+
+    if series is None:
+        return pd.DataFrame(columns=['Company', 'cumulative_bp_change_of_ownership'])
+
+    series = series[(series['prev_year'] > latest_year - (num_years + 1)) & (series['year'] <= latest_year)]
+
+    grouped = series.assign(ownership_change=series['ownership_change'].astype(float)).groupby('Company', observed=True)
+
+    # Only companies held in the latest year are ranked, as in the running change
+    change = grouped['ownership_change'].sum()[grouped['year'].max() == latest_year].round(2)
+
+    change = change.rename('cumulative_bp_change_of_ownership').reset_index()
+
+    change = change.sort_values(['cumulative_bp_change_of_ownership', 'Company'], ascending=[bottom, True],
+                                kind='stable', key=lambda col: col.astype(str) if col.name == 'Company' else col)
+
+    return change.head(n).reset_index(drop=True)
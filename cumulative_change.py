@@ -0,0 +1,122 @@
+from pathlib import Path
+import pandas as pd
+
+# One pass over the source table gives every yearly aggregate the cumulative change charts need
+TEMPLATE_PATH = Path(__file__).resolve().parent / 'SQL' / 'templates' / 'yearly_by_dimension.sql'
+
+# The source table, dimension table, key and output label of each dimension. Sector, region and country read the rollup
+# table, companies read the fact table because the rollup has no company column. Both are grouped by the integer key and
+# only the grouped rows are joined to the dimension table for their labels.
+DIMENSIONS = {
+'sector': {'source': 'oil_fund_rollup', 'dimension': 'sector_dim', 'key': 'sector_key', 'column': 'sector', 'label': 'Sector'},
+'region': {'source': 'oil_fund_rollup', 'dimension': 'region_dim', 'key': 'region_key', 'column': 'region', 'label': 'Region'},
+'country': {'source': 'oil_fund_rollup', 'dimension': 'country_dim', 'key': 'country_key', 'column': 'country', 'label': 'Country'},
+'company': {'source': 'oil_fund_fact', 'dimension': 'company_dim', 'key': 'company_key', 'column': 'name', 'label': 'Company'}}
+
+METRICS = ('ownership', 'market_value', 'both')
+
+
+def yearly_query(dimension, num_years, countries=None):
+    """
+    Builds the single scan query that aggregates the equity holdings of a dimension by year over the window.
+
+    Args:
+        dimension (str): 'sector', 'region', 'country' or 'company'.
+        num_years (int): The number of years in the window, counted back from the latest year.
+        countries (list): Optional countries to restrict the holdings to.
+
+    Returns:
+        tuple: The query and its parameters.
+    """
+
+    spec = DIMENSIONS[dimension]
+
+    with open(TEMPLATE_PATH, 'r') as file:
+        template = file.read()
+
+    if spec['source'] == 'oil_fund_rollup':
+        ownership_sum, ownership_count = 'SUM(ownership_sum)', 'SUM(ownership_count)'
+    else:
+        ownership_sum, ownership_count = 'SUM(percent_ownership)', 'COUNT(percent_ownership)'
+
+    country_filter = ("AND country_key IN (SELECT country_key FROM country_dim WHERE country IN ({}))"
+                      .format(','.join(['%s'] * len(countries))) if countries else '')
+
+    query = template.format(column=spec['column'], label=spec['label'], source=spec['source'], dimension=spec['dimension'],
+                            key=spec['key'], ownership_sum=ownership_sum, ownership_count=ownership_count,
+                            country_filter=country_filter)
+
+    return query, (num_years, *(countries or []))
+
+
+def running_change(df, key, value, latest_year, relative=False):
+    """
+    Sums the year over year change of value within each key, the same way as the LAG and running SUM of the old SQL files.
+    With relative=True each change is divided by the current value, as the market value query did.
+
+    Returns:
+        pandas.Series: The cumulative change of every key that has a change in the latest year, indexed by key.
+    """
+
+    df = df.sort_values([key, 'year'], kind='stable')
+
+    difference = df.groupby(key, observed=True)[value].diff()
+
+    if relative:
+        difference = difference / df[value] * 100
+
+    df = df.assign(difference=difference).dropna(subset=['difference'])
+
+    df = df.assign(cumulative=df.groupby(key, observed=True)['difference'].cumsum().round(2))
+
+    return df.loc[df['year'] == latest_year].set_index(key)['cumulative']
+
+
+def cumulative_change(yearly, dimension, latest_year, metric='ownership', top_n=None):
+    """
+    Computes the cumulative change of a dimension over the window from the result of its yearly query.
+
+    Args:
+        yearly (pandas.DataFrame): The result of the yearly query of the dimension.
+        dimension (str): 'sector', 'region', 'country' or 'company'.
+        latest_year (int): The latest year in the data.
+        metric (str): 'ownership' for the change in average ownership in basis points, 'market_value' for the percent change
+            in market value, or 'both'.
+        top_n (int): Only return the top_n rows.
+
+    Returns:
+        pandas.DataFrame: One row per member of the dimension, largest change first.
+    """
+
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of {METRICS}.")
+
+    label = DIMENSIONS[dimension]['label']
+
+    yearly = yearly.assign(avg_percent_ownership=yearly['ownership_sum'].astype(float) / yearly['ownership_count'].astype(float),
+                           market_value=yearly['market_value'].astype(float))
+
+    columns = {}
+
+    if metric in ('ownership', 'both'):
+        columns['cumulative_bp_change_of_ownership'] = running_change(yearly, label, 'avg_percent_ownership', latest_year)
+
+    if metric in ('market_value', 'both'):
+        columns['cumulative_change_mrkt_value'] = running_change(yearly, label, 'market_value', latest_year, relative=True)
+
+    result = pd.concat(columns, axis=1, join='inner').rename_axis(label).reset_index()
+
+    result = result.sort_values(list(columns)[0], ascending=False).reset_index(drop=True)
+
+    return result.head(top_n) if top_n else result
+
+
+def run_cumulative_change(backend, dimension, num_years, latest_year, metric='ownership', top_n=None, countries=None):
+    """
+    Runs the yearly query of a dimension and computes its cumulative change in one call.
+    """
+
+    query, params = yearly_query(dimension, num_years, countries)
+
+    return cumulative_change(backend.query(query, params), dimension, latest_year, metric, top_n)
+
@@ -0,0 +1,197 @@
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+import plotly.io as pio
+from cumulative_change import run_cumulative_change
+from charts import (eq_fi_figure, sector_proportions_figure, region_proportions_figure, sector_ownership_figure,
+                    sector_ownership_change_figure, sector_ownership_market_value_figure, region_ownership_figure,
+                    msci_ownership_figure)
+
+ROOT = Path(__file__).resolve().parent
+
+# Chart payloads published by the ETL after each load, one directory per data version (see publish_payloads)
+PAYLOAD_DIR = ROOT / 'payloads'
+
+# Names the data version of the newest complete payload, so the app never reads a payload that is still being written
+CURRENT_FILE = 'current.json'
+
+METADATA_QUERY = 'SQL/static/oil_fund_metadata.sql'
+
+# The queries behind the charts of Parts 1 and 2, by the name of the frame they produce
+STATIC_QUERIES = {
+'eq_fi_proportions': 'SQL/static/eq_fi_proportions.sql',
+'sector_proportions': 'SQL/static/sector/sector_proportions.sql',
+'region_proportions': 'SQL/static/region/region_proportions.sql',
+'sector_ownership': 'SQL/static/sector/sector_ownership.sql',
+'region_ownership': 'SQL/static/region/region_ownership.sql',
+'msci_ownership': 'SQL/static/region/MSCI_ownership.sql'}
+
+# Frames computed from the yearly aggregates of a dimension instead of a SQL file: (dimension, years, metric)
+CUMULATIVE_CHANGES = {
+'sector_ownership_change': ('sector', 10, 'ownership'),
+'sector_ownership_market_value': ('sector', 10, 'both')}
+
+# Every chart of Parts 1 and 2, as the builder from charts.py and the frame it plots
+FIGURES = {
+'eq_fi': (eq_fi_figure, 'eq_fi_proportions'),
+'sector_proportions': (sector_proportions_figure, 'sector_proportions'),
+'region_proportions': (region_proportions_figure, 'region_proportions'),
+'sector_ownership': (sector_ownership_figure, 'sector_ownership'),
+'sector_ownership_change': (sector_ownership_change_figure, 'sector_ownership_change'),
+'sector_ownership_market_value': (sector_ownership_market_value_figure, 'sector_ownership_market_value'),
+'region_ownership': (region_ownership_figure, 'region_ownership'),
+'msci_ownership': (msci_ownership_figure, 'msci_ownership')}
+
+
+def read_sql_file(query_path):
+    return (ROOT / query_path).read_text()
+
+
+def decimals_to_float(df):
+    # NUMERIC columns come back from Postgres as Decimals. They are stored as floats, which is how the charts plot them.
+    decimal_cols = [col for col in df.columns if df[col].dtype == object and df[col].map(lambda v: isinstance(v, Decimal)).any()]
+    return df.astype({col: float for col in decimal_cols})
+
+
+def publish_payloads(backend, payload_dir=PAYLOAD_DIR, keep=2):
+    """
+    Runs the queries behind the charts of Parts 1 and 2 once and writes their results and figures for the app.
+
+    The payload of a data version is a directory holding every frame as a Parquet file, every figure as its plotly JSON
+    spec, and a manifest with the metadata of the load. It is written next to the published payloads and moved into
+    place before current.json is pointed at it, and only the newest keep versions are kept.
+
+    Args:
+        backend (QueryBackend): The backend to run the queries with, from backends.create_backend.
+        payload_dir (pathlib.Path): The directory the payloads are published to.
+        keep (int): The number of data versions to keep.
+
+    Returns:
+        pathlib.Path: The path of the published payload.
+    """
+
+    payload_dir = Path(payload_dir)
+
+    metadata = backend.query(read_sql_file(METADATA_QUERY)).iloc[0]
+
+    data_version = str(metadata['data_version'])
+    latest_year = int(metadata['latest_year'])
+
+    path = payload_dir / data_version
+
+    # The charts only change with the data, so a version that has already been published is not built again
+    if not path.exists():
+        frames = backend.query_many({name: (read_sql_file(query_path), None) for name, query_path in STATIC_QUERIES.items()})
+
+        for name, (dimension, num_years, metric) in CUMULATIVE_CHANGES.items():
+            frames[name] = run_cumulative_change(backend, dimension, num_years, latest_year, metric=metric)
+
+        tmp_path = payload_dir / f'{data_version}.tmp'
+
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+
+        for name, df in frames.items():
+            decimals_to_float(df).to_parquet(tmp_path / f'{name}.parquet', index=False)
+
+        for name, (builder, frame) in FIGURES.items():
+            (tmp_path / f'{name}.json').write_text(builder(frames[frame]).to_json())
+
+        manifest = {'data_version': data_version,
+                    'first_year': int(metadata['first_year']),
+                    'latest_year': latest_year,
+                    'published_at': datetime.now(timezone.utc).isoformat(),
+                    'frames': list(frames),
+                    'figures': list(FIGURES)}
+
+        (tmp_path / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+
+        tmp_path.rename(path)
+
+    current_tmp = payload_dir / f'{CURRENT_FILE}.tmp'
+    current_tmp.write_text(json.dumps({'data_version': data_version}))
+    current_tmp.replace(payload_dir / CURRENT_FILE)
+
+    # Older versions are removed once current.json no longer points at them
+    versions = sorted((p for p in payload_dir.iterdir() if p.is_dir() and p.suffix != '.tmp'), key=lambda p: p.name, reverse=True)
+
+    for old_path in versions[keep:]:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    print(f"Published chart payload for data version {data_version}.")
+
+    return path
+
+
+def current_version(payload_dir=PAYLOAD_DIR):
+    # The data version of the newest published payload, or None if nothing has been published
+    try:
+        return json.loads((Path(payload_dir) / CURRENT_FILE).read_text())['data_version']
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def read_payload(data_version, payload_dir=PAYLOAD_DIR):
+    """
+    Reads the published payload of a data version.
+
+    Returns:
+        dict: The manifest, the frames by name and the figures by name as plotly figure objects.
+    """
+
+    path = Path(payload_dir) / data_version
+
+    manifest = json.loads((path / 'manifest.json').read_text())
+
+    frames = {name: pd.read_parquet(path / f'{name}.parquet') for name in manifest['frames']}
+
+    figures = {name: pio.from_json((path / f'{name}.json').read_text()) for name in manifest['figures']}
+
+    return {'manifest': manifest, 'frames': frames, 'figures': figures}
+
+
+class MetadataCheck:
+    """
+    Reads the metadata of the latest load (see SQL/static/oil_fund_metadata.sql) from the database on a background thread.
+
+    The app starts from the published payload and its manifest without waiting for the database, and uses the metadata
+    read here as soon as it is known, so a load whose payload was not published is still seen. It is read again at most
+    every interval seconds, to see new loads.
+    """
+
+    def __init__(self, backend, interval=60):
+        self.backend = backend
+        self.interval = interval
+        self.metadata = None
+        self.future = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metadata-check')
+
+    def read(self):
+        metadata = self.backend.query(read_sql_file(METADATA_QUERY)).iloc[0]
+        self.metadata = metadata
+        return metadata
+
+    def refresh(self):
+        # Starts a read unless one is running or the last one started less than interval seconds ago
+        with self.lock:
+            if self.future is None or (self.future.done() and time.monotonic() - self.checked_at >= self.interval):
+                self.checked_at = time.monotonic()
+                self.future = self.executor.submit(self.read)
+            return self.future
+
+    def latest(self):
+        # The metadata of the last successful read, or None if nothing has been read yet. Does not wait.
+        self.refresh()
+        return self.metadata
+
+    def wait(self):
+        # Waits for the running read and returns its metadata. Raises if the database could not be read.
+        return self.refresh().result()
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from country_series import COUNTRY_GROUPS, COUNTRY_GROUPS_PATH, COUNTRY_SERIES_PATH, COMPANY_SERIES_PATH, group_countries, query_countries
+
+# The number of years a user can pick in Part 3
+YEAR_WINDOWS = range(0, 21)
+
+# The per country queries behind the three Part 3 charts
+SERIES_PATHS = (COUNTRY_SERIES_PATH, COMPANY_SERIES_PATH)
+
+
+class CacheWarmer:
+    """
+    Fills the query cache in the background with the rows the preset country groups of Part 3 need, so the first user to
+    pick a preset does not wait for its queries.
+
+    The Part 3 charts are assembled from yearly series that are cached per country and cover every year, so the rows of a
+    country serve every year window. Warming every preset and year window therefore takes one query per batch of preset
+    countries and series instead of one per combination. The batches run on a worker pool of max_workers threads, which
+    bounds how many warming queries are in flight so the sessions keep the rest of the connection pool.
+
+    Rows are only cached under the data version the warmer was started for. If the app sees a new load while the warmer
+    runs, the remaining batches are skipped and what was fetched is dropped.
+    """
+
+    def __init__(self, backend, cache, max_workers=2, batch_size=10):
+        self.backend = backend
+        self.cache = cache
+        self.version = cache.version
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.groups = {}
+        self.seconds = None
+        self.errors = 0
+        self.thread = None
+
+    def start(self):
+        # Warms the cache on a daemon thread and returns right away
+        self.thread = threading.Thread(target=self.warm, name='cache-warmer', daemon=True)
+        self.thread.start()
+        return self
+
+    def warm(self):
+        """
+        Fetches and caches the series of every country in a preset group.
+
+        Returns:
+            dict: The coverage report, see report.
+        """
+
+        start = time.perf_counter()
+
+        try:
+            # The warmer reads the cache with peek and contains, so its lookups do not count as hits or misses of the sessions
+            country_groups_df = self.cache.peek((COUNTRY_GROUPS_PATH,))
+
+            if country_groups_df is None:
+                with open(COUNTRY_GROUPS_PATH, 'r') as file:
+                    country_groups_df = self.backend.query(file.read())
+                self.cache.put((COUNTRY_GROUPS_PATH,), country_groups_df, self.version)
+
+            self.groups = {group: group_countries(country_groups_df, group) for group in COUNTRY_GROUPS}
+
+            countries = self.countries()
+
+            batches = [(query_path, countries[i:i + self.batch_size])
+                       for query_path in SERIES_PATHS for i in range(0, len(countries), self.batch_size)]
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self.warm_batch, query_path, batch) for query_path, batch in batches]
+
+                for future in futures:
+                    # A failed batch is left for the sessions to fetch, it does not stop the others
+                    try:
+                        future.result()
+                    except Exception:
+                        self.errors += 1
+        except Exception:
+            self.errors += 1
+
+        self.seconds = time.perf_counter() - start
+
+        return self.report()
+
+    def warm_batch(self, query_path, countries):
+        if self.cache.version != self.version:
+            return
+
+        missing = [country for country in countries if not self.cache.contains((query_path, country))]
+
+        if missing:
+            query_countries(self.backend, self.cache, query_path, missing, self.version)
+
+    def countries(self):
+        # Every country of a preset group, once
+        return list(dict.fromkeys(country for members in self.groups.values() for country in members))
+
+    def report(self):
+        """
+        Reports how much of the presets the cache covers now, which can drop again as entries are evicted.
+
+        Returns:
+            dict: The preset countries, presets and preset and year window combinations, and how many of each are served
+                from the cache, the seconds the warming took (None while it runs) and the number of failed batches.
+        """
+
+        countries = self.countries()
+
+        cached = {country for country in countries if all(self.cache.contains((query_path, country)) for query_path in SERIES_PATHS)}
+
+        presets_cached = [group for group, members in self.groups.items() if set(members) <= cached]
+
+        return {'countries': len(countries), 'countries_cached': len(cached),
+                'presets': len(self.groups), 'presets_cached': len(presets_cached),
+                'combinations': len(self.groups) * len(YEAR_WINDOWS), 'combinations_cached': len(presets_cached) * len(YEAR_WINDOWS),
+                'seconds': None if self.seconds is None else round(self.seconds, 2), 'errors': self.errors}
+
+
+if __name__ == '__main__':
+    import os
+    import streamlit as st
+    from backends import create_backend
+    from query_cache import ResultCache
+
+    # Warms a fresh cache in the foreground and prints the report, to measure the warming against a backend
+
+    backend_name = os.environ.get('OIL_FUND_BACKEND', 'postgres')
+    backend = create_backend(backend_name, **(st.secrets["postgres"] if backend_name == 'postgres' else {}))
+
+    cache = ResultCache()
+
+    with open('SQL/static/oil_fund_metadata.sql', 'r') as file:
+        cache.set_version(backend.query(file.read()).iloc[0]['data_version'])
+
+    report = CacheWarmer(backend, cache).warm()
+
+    print(f"Warmed {report['countries_cached']} of {report['countries']} preset countries, {report['presets_cached']} of {report['presets']} presets "
+          f"and {report['combinations_cached']} of {report['combinations']} preset and year window combinations in {report['seconds']}s "
+          f"({report['errors']} failed batches).")
+
+    print(cache.stats())
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class ResultCache:
+    """
+    Size bounded cache of query results that is tied to the version of the loaded data.
+
+    The ETL writes a new data_version to oil_fund_metadata after every successful load. Entries are kept for as long as
+    the version they were stored under is current, and the whole cache is dropped as soon as a different version is seen.
+    Results are stored as Arrow tables, which are columnar and dictionary encode the repeated labels, and the least
+    recently used entries are evicted once the stored tables go over max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.nbytes = 0
+                self.version = version
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            value, _ = self.entries[key]
+        return self.unpack(value)
+
+    def put(self, key, df, version=None):
+        # A result computed for another data version, such as one fetched in the background while a new load was seen, is dropped
+        value, nbytes = self.pack(df)
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def peek(self, key):
+        # Returns the entry for key, or None, without counting a hit or a miss or refreshing the entry, for background work
+        with self.lock:
+            if key not in self.entries:
+                return None
+            value, _ = self.entries[key]
+        return self.unpack(value)
+
+    def contains(self, key):
+        # Checks for an entry without counting a hit or a miss, for reporting what is cached
+        with self.lock:
+            return key in self.entries
+
+    def get_or_run(self, key, run):
+        """
+        Returns the cached result for key, or calls run() to compute it and stores the result.
+        """
+
+        df = self.get(key)
+        if df is None:
+            df = run()
+            self.put(key, df)
+        return df
+
+    def stats(self):
+        return {'version': self.version, 'entries': len(self.entries), 'megabytes': round(self.nbytes / 1024 ** 2, 2),
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    @staticmethod
+    def pack(df):
+        if pa is None:
+            return df.copy(), int(df.memory_usage(deep=True).sum())
+
+        # Repeated labels are stored once per column instead of once per row
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = pa.Table.from_arrays([ResultCache.encode(column) for column in table.columns], names=table.column_names)
+        return table, table.nbytes
+
+    @staticmethod
+    def encode(column):
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            return column.dictionary_encode()
+
+        # Categoricals can carry labels that none of their rows use, for example a frame split from a larger result.
+        # Encoding them again keeps only the labels the rows use.
+        if pa.types.is_dictionary(column.type):
+            return column.cast(column.type.value_type).dictionary_encode()
+
+        return column
+
+    @staticmethod
+    def unpack(value):
+        if pa is None:
+            return value.copy()
+        return value.to_pandas()
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT / 'ETL'))
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('streamlit')
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from etl import df_schema, write_table
+
+# Loads a small synthetic frame into a throwaway local Postgres with COPY and with the INSERT fallback, and records the
+# rows per second of each. Skipped when no database is reachable. Point OIL_FUND_TEST_DATABASE_URL at a database the
+# test may create and drop tables in.
+DATABASE_URL = os.environ.get('OIL_FUND_TEST_DATABASE_URL', 'postgresql+psycopg2://postgres@localhost:5432/postgres')
+
+ROWS = 20000
+
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = create_engine(DATABASE_URL, connect_args={'connect_timeout': 3})
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip(f"No Postgres database reachable at {engine.url.render_as_string(hide_password=True)}.")
+
+    yield engine
+
+    engine.dispose()
+
+
+def synthetic_frame(rows=ROWS, seed=0):
+    # Rows with the columns and types of the transformed data, including the characters the COPY CSV has to escape
+    rng = np.random.default_rng(seed)
+
+    names = np.array(['Equinor ASA', 'Nestle SA', 'Berkshire Hathaway Inc, Class B', 'Marks & Spencer "Group" PLC', 'Ørsted A/S'])
+
+    data = pd.DataFrame({'region': rng.choice(['Europe', 'North America', 'Asia'], rows),
+                         'country': rng.choice(['Norway', 'Switzerland', 'United States', 'Denmark'], rows),
+                         'name': rng.choice(names, rows).astype(object),
+                         'sector': rng.choice(['Energy', 'Consumer Staples', 'Financials'], rows),
+                         'market_value': rng.integers(1, 10 ** 10, rows),
+                         'percent_ownership': rng.integers(0, 1000, rows) / 100,
+                         'category': rng.choice(['Equity', 'Fixed Income'], rows),
+                         'year': rng.integers(1998, 2023, rows)})
+
+    data.loc[::97, 'sector'] = None
+
+    return data
+
+
+def read_back(engine, table):
+    # The table in a fixed row order and with NUMERIC read back as floats, to compare it with the written frame
+    loaded = pd.read_sql(f"SELECT * FROM {table}", engine)
+
+    loaded['percent_ownership'] = loaded['percent_ownership'].astype(float)
+
+    return loaded.sort_values(list(loaded.columns)).reset_index(drop=True)
+
+
+def test_copy_and_insert_load_the_same_rows(engine, record_property):
+    data = synthetic_frame()
+
+    expected = data.sort_values(list(data.columns)).reset_index(drop=True)
+
+    loaded = {}
+
+    for method in ('copy', 'insert'):
+        table = f'test_load_{method}'
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+        start = time.perf_counter()
+
+        with engine.begin() as conn:
+            write_table(data, table, conn, df_schema, method=method)
+
+        rows_per_second = len(data) / (time.perf_counter() - start)
+
+        record_property(f'{method}_rows_per_second', round(rows_per_second))
+
+        print(f"{method.upper()}: {rows_per_second:,.0f} rows/s")
+
+        try:
+            loaded[method] = read_back(engine, table)
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+        assert len(loaded[method]) == len(data)
+
+        pd.testing.assert_frame_equal(loaded[method], expected, check_dtype=False)
+
+    pd.testing.assert_frame_equal(loaded['copy'], loaded['insert'])
@@ -0,0 +1,48 @@
+import glob
+import os
+import sys
+from pathlib import Path
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT / 'ETL'))
+
+pytest.importorskip('streamlit')
+
+from etl import extract_data, transform_data, clean_files
+from incremental import OUTPUT_COLUMNS, output_hashes
+
+# The streaming ETL cleans the NBIM files one at a time and has to produce the same rows as the batch transform of the
+# whole dataset, including the name merges and the rules that look across every year
+DATA_DIR = ROOT / 'data'
+
+
+@pytest.fixture
+def data_dir():
+    if not glob.glob(str(DATA_DIR / '*.csv')):
+        pytest.skip(f"No data files in {DATA_DIR}.")
+
+    cwd = os.getcwd()
+
+    yield DATA_DIR
+
+    os.chdir(cwd)
+
+
+def test_stream_output_matches_batch_output(data_dir, tmp_path):
+    batch = transform_data(extract_data(data_dir), staging_dir=tmp_path, dictionary_path=None)
+
+    os.chdir(data_dir)
+
+    stream = pd.concat(clean_files(sorted(glob.glob('*.csv'))), ignore_index=True)
+
+    assert len(stream) == len(batch)
+
+    assert stream['name'].nunique() == batch['name'].nunique()
+
+    for col in OUTPUT_COLUMNS:
+        assert stream[col].astype(object).equals(batch[col].astype(object)), col
+
+    pd.testing.assert_frame_equal(output_hashes(stream), output_hashes(batch))